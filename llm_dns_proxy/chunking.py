@@ -4,65 +4,51 @@ Handles the splitting of encrypted messages into DNS-compatible chunks.
 """
 
 import base64
-import math
-import uuid
+import re
+import secrets
+import time
 import zlib
+from collections import OrderedDict, deque
 from typing import List, Dict, Optional, Tuple
 
-from .config import get_dns_suffix, get_dns_suffix_parts, format_dns_query, validate_dns_suffix_in_query
+from .config import get_dns_suffix
 
 
-def base36encode(number: int) -> str:
-    """Convert integer to base36 string using 0-9a-z"""
-    if number == 0:
-        return '0'
+# base32hex only uses 0-9A-V, so labels survive case folding by resolvers.
+# Case mapping is done with a single bytes.translate pass in each direction.
+_B32_UPPER = b'ABCDEFGHIJKLMNOPQRSTUV'
+_B32_LOWER = b'abcdefghijklmnopqrstuv'
+_B32_TO_LABEL = bytes.maketrans(_B32_UPPER, _B32_LOWER)
+_LABEL_TO_B32 = bytes.maketrans(_B32_LOWER, _B32_UPPER)
 
-    alphabet = '0123456789abcdefghijklmnopqrstuvwxyz'
-    result = ''
-    while number:
-        number, remainder = divmod(number, 36)
-        result = alphabet[remainder] + result
-    return result
 
+def bytes_to_base32(data: bytes) -> str:
+    """Convert bytes to unpadded lowercase base32hex (0-9a-v), safe for DNS labels"""
+    return base64.b32hexencode(data).rstrip(b'=').translate(_B32_TO_LABEL).decode('ascii')
 
-def base36decode(string: str) -> int:
-    """Convert base36 string to integer"""
-    return int(string, 36)
 
+def base32_to_bytes(string: str) -> bytes:
+    """Convert unpadded base32hex string back to bytes (label dots are ignored)"""
+    encoded = string.encode('ascii').translate(_LABEL_TO_B32, b'.')
+    return base64.b32hexdecode(encoded + b'=' * (-len(encoded) % 8))
 
-def bytes_to_base36(data: bytes) -> str:
-    """Convert bytes to base36 string with length prefix"""
-    # Convert bytes to big integer
-    number = int.from_bytes(data, byteorder='big')
-    encoded = base36encode(number)
-    # Prefix with original length to preserve it during decode
-    length_prefix = base36encode(len(data))
-    return f"{length_prefix}z{encoded}"
 
+# Query bodies (between the opcode prefix and the DNS suffix), matched in one
+# pass instead of split + int() under try/except
+_CHUNK_BODY_RE = re.compile(r'([^.]+)\.([0-9]+)\.([0-9]+)\.(.+)')  # sid.index.total.data
+_RESPONSE_BODY_RE = re.compile(r'([^.]+)\.([0-9]+)')  # sid.index
 
-def base36_to_bytes(string: str) -> bytes:
-    """Convert base36 string back to bytes"""
-    # Split at 'z' separator
-    parts = string.split('z', 1)
-    if len(parts) != 2:
-        raise ValueError("Invalid base36 format")
 
-    length_str, data_str = parts
-    original_length = base36decode(length_str)
-    number = base36decode(data_str)
-
-    # Convert back to bytes with original length
-    if number == 0:
-        return b'\x00' * original_length
-
-    byte_length = (number.bit_length() + 7) // 8
-    result = number.to_bytes(byte_length, byteorder='big')
-
-    # Pad with leading zeros if needed
-    if len(result) < original_length:
-        result = b'\x00' * (original_length - len(result)) + result
-
-    return result
+def _strip_query(query: str, prefix: str) -> Optional[str]:
+    """Return the labels between prefix and the DNS suffix, or None if either is missing."""
+    if query.endswith('.'):
+        query = query[:-1]
+    suffix = '.' + get_dns_suffix()
+    # Reject on plain string compares before paying for a split
+    if (len(query) <= len(prefix) + len(suffix)
+            or not query.startswith(prefix) or not query.endswith(suffix)):
+        return None
+    return query[len(prefix):-len(suffix)]
 
 
 class DNSChunker:
@@ -70,17 +56,46 @@ class DNSChunker:
     MAX_DNS_RECORD_LENGTH = 255
     MAX_DNS_QNAME_LENGTH = 253
     MAX_DATA_LABEL_LENGTH = 50  # Conservative limit for single label
+    PARSE_CACHE_SIZE = 1024  # Recently parsed chunk queries kept for retries
+    MAX_COMPLETED_MESSAGES = 10000  # Sessions whose last message is kept for retries
+    COMPLETED_MESSAGE_TTL = 300.0  # Seconds a completed message is kept
+    MAX_MESSAGE_CHUNKS = 999  # Most chunks per message; the qname layout assumes m.999.999.999
 
     def __init__(self):
-        self.pending_messages: Dict[str, Dict[int, str]] = {}
-        self.total_chunks: Dict[str, int] = {}
-
-    def _split_data_into_labels(self, data: str, max_per_label: int) -> List[str]:
-        """Split long data into multiple DNS labels"""
-        labels = []
-        for i in range(0, len(data), max_per_label):
-            labels.append(data[i:i + max_per_label])
-        return labels
+        # Chunk slots are preallocated once the total is known from the first chunk
+        self.pending_messages: Dict[str, List[Optional[str]]] = {}
+        self.received_counts: Dict[str, int] = {}
+        # Chunks of each session's last completed message, to recognise retries
+        # that arrive after it was already processed. Ordered oldest first, so
+        # expiry and eviction pop from the front
+        self.completed_messages: "OrderedDict[str, List[str]]" = OrderedDict()
+        self.completed_at: Dict[str, float] = {}
+        # Clients retry chunks on timeout, so remember recent parses by query name
+        self._parse_cache: Dict[str, Tuple[str, int, int, str]] = {}
+        self._parse_order: deque = deque()
+
+    def _parse_chunk_query(self, query: str) -> Optional[Tuple[str, int, int, str]]:
+        """Parse a message chunk query into (session_id, index, total, data), or None if invalid."""
+        cached = self._parse_cache.get(query)
+        if cached is not None:
+            return cached
+
+        body = _strip_query(query, 'm.')
+        if body is None:
+            return None
+
+        match = _CHUNK_BODY_RE.fullmatch(body)
+        if match is None:
+            return None
+
+        # Everything after total_chunks is data labels
+        session_id, index_str, total_str, data_labels = match.groups()
+        parsed = (session_id, int(index_str), int(total_str), data_labels.replace('.', ''))
+        if len(self._parse_order) >= self.PARSE_CACHE_SIZE:
+            self._parse_cache.pop(self._parse_order.popleft(), None)
+        self._parse_cache[query] = parsed
+        self._parse_order.append(query)
+        return parsed
 
     def create_chunks(self, encrypted_data: bytes, session_id: str = None) -> List[str]:
         """
@@ -90,45 +105,51 @@ class DNSChunker:
         if session_id is None:
             # Use 3-digit session ID for 1000 concurrent users (000-999)
             # Zero-padded for consistency
-            session_num = uuid.uuid4().int % 1000
+            session_num = secrets.randbelow(1000)
             session_id = f"{session_num:03d}"
 
-        # Convert Fernet token to DNS-safe base36 for labels
-        # Base36 uses only 0-9a-z which is DNS-safe and more efficient than base32
-        data_b36 = bytes_to_base36(encrypted_data)
+        # Convert payload bytes to DNS-safe base32hex for labels
+        # Base32hex uses only 0-9a-v and encodes in linear time (no bignum math)
+        data_b32 = bytes_to_base32(encrypted_data)
 
         # Calculate base qname overhead: "m." + sessionid + "." + index + "." + total + "." + ".<suffix>"
         # Worst case with _sonos._tcp.local: m.999.999.999.._sonos._tcp.local = ~39 chars + dots
         dns_suffix = get_dns_suffix()
         base_overhead = len(f"m.999.999.999.{dns_suffix}") + 5  # +5 for safety margin
 
-        max_data_per_chunk = self.MAX_DNS_QNAME_LENGTH - base_overhead
-        total_chunks = math.ceil(len(data_b36) / max_data_per_chunk)
+        # Data labels are joined with dots, so each full label costs one extra byte
+        available = self.MAX_DNS_QNAME_LENGTH - base_overhead
+        label_len = self.MAX_DATA_LABEL_LENGTH
+        full_labels, remainder = divmod(available + 1, label_len + 1)
+        max_data_per_chunk = full_labels * label_len + max(0, remainder - 1)
+        if max_data_per_chunk <= 0:
+            raise ValueError(f"DNS suffix too long to fit message data: {dns_suffix}")
+
+        data_len = len(data_b32)
+        if 0 < data_len <= max_data_per_chunk:
+            # Short messages fit in one query, so skip the chunking loop
+            data_part = '.'.join([data_b32[j:j + label_len] for j in range(0, data_len, label_len)])
+            return [f"m.{session_id}.0.1.{data_part}.{dns_suffix}"]
+
+        total_chunks = -(-data_len // max_data_per_chunk)
+        if total_chunks > self.MAX_MESSAGE_CHUNKS:
+            raise ValueError(f"Message too long: needs {total_chunks} chunks, at most {self.MAX_MESSAGE_CHUNKS} allowed")
+
+        # Everything except the index and data labels is constant across chunks
+        query_prefix = f"m.{session_id}."
+        total_part = f".{total_chunks}."
+        query_suffix = f".{dns_suffix}"
 
         chunks = []
-        for i in range(total_chunks):
-            start = i * max_data_per_chunk
-            end = min(start + max_data_per_chunk, len(data_b36))
-            chunk_data = data_b36[start:end]
-
-            # Split chunk_data into multiple labels if needed
-            data_labels = self._split_data_into_labels(chunk_data, self.MAX_DATA_LABEL_LENGTH)
+        for i, start in enumerate(range(0, data_len, max_data_per_chunk)):
+            end = min(start + max_data_per_chunk, data_len)
 
-            # Build query with multiple data labels (m = message)
-            data_part = '.'.join(data_labels)
-            query = format_dns_query("m", session_id, i, total_chunks, data_part)
+            # Slice labels straight out of the encoded data (m = message)
+            data_part = '.'.join([data_b32[j:min(j + label_len, end)] for j in range(start, end, label_len)])
+            query = f"{query_prefix}{i}{total_part}{data_part}{query_suffix}"
 
-            # Validate qname length
             if len(query) > self.MAX_DNS_QNAME_LENGTH:
-                # If still too long, reduce data further
-                reduced_data_len = self.MAX_DNS_QNAME_LENGTH - len(query) + len(data_part)
-                if reduced_data_len > 0:
-                    chunk_data = chunk_data[:reduced_data_len]
-                    data_labels = self._split_data_into_labels(chunk_data, self.MAX_DATA_LABEL_LENGTH)
-                    data_part = '.'.join(data_labels)
-                    query = format_dns_query("m", session_id, i, total_chunks, data_part)
-                else:
-                    raise ValueError(f"Cannot fit data into DNS qname constraints for chunk {i}")
+                raise ValueError(f"Cannot fit data into DNS qname constraints for chunk {i}")
 
             chunks.append(query)
 
@@ -142,42 +163,65 @@ class DNSChunker:
 
         Expected format: m.sessionid.index.total.data1.data2...dataN.<suffix>
         """
-        parts = query.split('.')
-        if len(parts) < 6 or parts[0] != 'm' or not validate_dns_suffix_in_query(parts):
+        parsed = self._parse_chunk_query(query)
+        if parsed is None:
             return None, None
 
-        try:
-            session_id = parts[1]
-            chunk_index = int(parts[2])
-            total_chunks = int(parts[3])
-
-            # Extract data labels (everything between total_chunks and suffix)
-            suffix_parts = get_dns_suffix_parts()
-            data_labels = parts[4:-len(suffix_parts)]  # Skip suffix at end
-            chunk_data = ''.join(data_labels)  # Rejoin data parts
-
-            if session_id not in self.pending_messages:
-                self.pending_messages[session_id] = {}
-                self.total_chunks[session_id] = total_chunks
+        session_id, chunk_index, total_chunks, chunk_data = parsed
 
-            self.pending_messages[session_id][chunk_index] = chunk_data
-
-            if len(self.pending_messages[session_id]) == self.total_chunks[session_id]:
-                complete_data = ''
-                for i in range(self.total_chunks[session_id]):
-                    complete_data += self.pending_messages[session_id][i]
+        try:
+            pending = self.pending_messages.get(session_id)
+            if pending is None:
+                # The index is never negative, so this also rejects a zero total.
+                # Slots are preallocated, so cap the total before trusting it
+                if chunk_index >= total_chunks or total_chunks > self.MAX_MESSAGE_CHUNKS:
+                    return None, None
+                completed = self.completed_messages.get(session_id)
+                if (completed is not None and len(completed) == total_chunks
+                        and completed[chunk_index] == chunk_data):
+                    # A late retry of a message already handed on; processing
+                    # it again would start a stale message or rerun a one-chunk one
+                    return session_id, None
+                pending = self.pending_messages[session_id] = [None] * total_chunks
+                self.received_counts[session_id] = 0
+            elif chunk_index >= len(pending):
+                return None, None
+
+            if pending[chunk_index] is None:
+                self.received_counts[session_id] += 1
+            pending[chunk_index] = chunk_data
+
+            if self.received_counts[session_id] == len(pending):
+                complete_data = ''.join(pending)
 
                 del self.pending_messages[session_id]
-                del self.total_chunks[session_id]
+                del self.received_counts[session_id]
+                self._remember_completed(session_id, pending)
 
-                # Decode using base36
-                return session_id, base36_to_bytes(complete_data)
+                # Decode using base32hex
+                return session_id, base32_to_bytes(complete_data)
 
             return session_id, None
 
-        except (ValueError, IndexError, base64.binascii.Error) as e:
+        except (ValueError, base64.binascii.Error) as e:
             return None, None
 
+    def _remember_completed(self, session_id: str, chunks: List[str]):
+        """Keep a completed message's chunks for retries, dropping stale or excess sessions."""
+        now = time.monotonic()
+        self.completed_messages[session_id] = chunks
+        self.completed_messages.move_to_end(session_id)
+        self.completed_at[session_id] = now
+
+        # Drop sessions past COMPLETED_MESSAGE_TTL or beyond MAX_COMPLETED_MESSAGES
+        while self.completed_messages:
+            oldest = next(iter(self.completed_messages))
+            if (len(self.completed_messages) <= self.MAX_COMPLETED_MESSAGES
+                    and now - self.completed_at[oldest] <= self.COMPLETED_MESSAGE_TTL):
+                break
+            del self.completed_messages[oldest]
+            del self.completed_at[oldest]
+
     def create_response_chunks(self, encrypted_data: bytes, session_id: str) -> Dict[int, str]:
         """
         Create response chunks as TXT records indexed by chunk number.
@@ -191,7 +235,11 @@ class DNSChunker:
         max_prefix_size = 10  # "999:999:" with some margin
         max_chunk_size = self.MAX_DNS_RECORD_LENGTH - max_prefix_size
 
-        total_chunks = math.ceil(len(data_b64) / max_chunk_size)
+        # Most answers fit in a single TXT record
+        if 0 < len(data_b64) <= max_chunk_size:
+            return {0: f"0:1:{data_b64}"}
+
+        total_chunks = -(-len(data_b64) // max_chunk_size)
         chunks = {}
 
         for i in range(total_chunks):
@@ -215,23 +263,30 @@ class DNSChunker:
 
         return chunks
 
-    def parse_response_query(self, query: str) -> Tuple[Optional[str], Optional[int]]:
+    def parse_response_query(self, query: str, opcode: str = 'g') -> Tuple[Optional[str], Optional[int]]:
         """
         Parse response retrieval query: g.sessionid.index.<suffix>
+        (or any other <opcode>.sessionid.number.<suffix> query).
         Returns (session_id, chunk_index) or (None, None) if invalid.
         """
-        parts = query.split('.')
-        suffix_parts = get_dns_suffix_parts()
-        expected_length = 3 + len(suffix_parts)  # g + session_id + index + suffix
-        if len(parts) != expected_length or parts[0] != 'g' or not validate_dns_suffix_in_query(parts):
+        body = _strip_query(query, f'{opcode}.')
+        if body is None:
             return None, None
 
-        try:
-            session_id = parts[1]
-            chunk_index = int(parts[2])
-            return session_id, chunk_index
-        except (ValueError, IndexError):
+        match = _RESPONSE_BODY_RE.fullmatch(body)
+        if match is None:
             return None, None
+        return match.group(1), int(match.group(2))
+
+    def parse_status_query(self, query: str) -> Optional[str]:
+        """
+        Parse response status query: s.sessionid.<suffix>
+        Returns the session_id or None if invalid.
+        """
+        session_id = _strip_query(query, 's.')
+        if session_id is None or '.' in session_id:
+            return None
+        return session_id
 
     def reassemble_response(self, chunks: Dict[int, str]) -> bytes:
         """
@@ -244,10 +299,11 @@ class DNSChunker:
         # First, determine the total number of chunks expected
         total_chunks = None
         for chunk_data in chunks.values():
-            parts = chunk_data.split(':', 2)
-            if len(parts) == 3:
+            _, _, rest = chunk_data.partition(':')
+            total_str, sep, _ = rest.partition(':')
+            if sep:
                 try:
-                    chunk_total = int(parts[1])
+                    chunk_total = int(total_str)
                     if total_chunks is None or chunk_total > total_chunks:
                         total_chunks = chunk_total
                 except ValueError:
@@ -256,38 +312,37 @@ class DNSChunker:
         if total_chunks is None:
             return b''  # Can't determine expected chunk count
 
-        # Check if we have all expected chunks (0 to total_chunks-1)
-        expected_indices = set(range(total_chunks))
-        available_indices = set(chunks.keys())
-
-        if expected_indices != available_indices:
+        # Indices are dense from 0, so an exact count plus membership check
+        # stands in for comparing index sets (no sets, no sort)
+        if len(chunks) != total_chunks or not all(i in chunks for i in range(total_chunks)):
             # Missing chunks - return empty to indicate incomplete data
-            # missing = expected_indices - available_indices
-            # Silently return empty for incomplete chunks
             return b''
 
-        # All chunks present - reassemble in order
-        # Reassembling all chunks
-        sorted_chunks = sorted(chunks.items())
-        complete_data = ''
-
-        for _, chunk in sorted_chunks:
-            parts = chunk.split(':', 2)
-            if len(parts) == 3:
-                complete_data += parts[2]
+        # All chunks present - walk them in index order and accumulate ASCII
+        # bytes directly so the token is only copied once at the end
+        buf = bytearray()
+        for idx in range(total_chunks):
+            chunk = chunks[idx]
+            sep = chunk.find(':', chunk.find(':') + 1)
+            if sep > 0:
+                buf += chunk[sep + 1:].encode('ascii')
 
         # Return the Fernet token as bytes (already in proper format)
-        result = complete_data.encode('ascii')
-        # Successfully reassembled data
-        return result
+        return bytes(buf)
 
-    def create_streaming_chunks(self, crypto_manager, text_segments: list, session_id: str) -> Dict[int, str]:
+    def create_streaming_chunks(self, crypto_manager, text_segments: list, session_id: str,
+                                previous: Optional[Dict[int, str]] = None) -> Dict[int, str]:
         """Create streaming chunks with optimal batching for TXT records.
 
+        Each chunk is a self-contained token, so clients can decrypt chunks as
+        they arrive. Batching is greedy and deterministic, so every chunk but
+        the last one in ``previous`` is closed and its token is reused as is.
+
         Args:
             crypto_manager: CryptoManager instance for encryption
             text_segments: List of text pieces to batch and encrypt
             session_id: Session identifier
+            previous: Chunks from an earlier call over a prefix of text_segments
 
         Returns:
             Dictionary mapping chunk index to TXT record data
@@ -295,6 +350,9 @@ class DNSChunker:
         if not text_segments:
             return {}
 
+        # All but the last previous chunk are closed batches
+        reusable = len(previous) - 1 if previous else 0
+
         chunks = {}
         # More conservative sizing: account for index:total: prefix (up to "999:999:")
         # Plus significant Fernet overhead (~60-80 bytes for base64 encoding + crypto)
@@ -303,22 +361,27 @@ class DNSChunker:
         max_txt_data_size = self.MAX_DNS_RECORD_LENGTH - max_prefix_size - max_fernet_overhead
 
         current_batch = ""
+        current_batch_bytes = 0
         batch_segments = []
         chunk_index = 0
+        worst_case_prefix = len("0:999:")
 
         for segment in text_segments:
             # Try adding this segment to current batch
             test_batch = current_batch + segment
+            test_batch_bytes = current_batch_bytes + len(segment.encode('utf-8'))
 
-            # Test actual encryption to get real size
-            test_encrypted = crypto_manager.encrypt_chunk(test_batch, sequence=0)
-            test_b64 = test_encrypted.decode('ascii')
-            estimated_final_size = len(f"0:999:{test_b64}")  # Worst case prefix
+            # Token size follows from the plaintext length, so only the batches
+            # that are actually emitted get encrypted
+            estimated_final_size = worst_case_prefix + crypto_manager.encrypted_chunk_length(test_batch_bytes)
 
             if estimated_final_size > self.MAX_DNS_RECORD_LENGTH and current_batch:
-                # Current batch is full, create chunk
-                encrypted_batch = crypto_manager.encrypt_chunk(current_batch, sequence=chunk_index)
-                batch_b64 = encrypted_batch.decode('ascii')
+                # Current batch is full, create chunk (unchanged batches keep their token)
+                if chunk_index < reusable:
+                    batch_b64 = previous[chunk_index].split(':', 2)[2]
+                else:
+                    encrypted_batch = crypto_manager.encrypt_chunk(current_batch, sequence=chunk_index)
+                    batch_b64 = encrypted_batch.decode('ascii')
 
                 # Create TXT record (we'll update total count later)
                 txt_record = f"{chunk_index}:0:{batch_b64}"
@@ -326,11 +389,13 @@ class DNSChunker:
 
                 # Start new batch
                 current_batch = segment
+                current_batch_bytes = test_batch_bytes - current_batch_bytes
                 batch_segments = [segment]
                 chunk_index += 1
             else:
                 # Add to current batch
                 current_batch = test_batch
+                current_batch_bytes = test_batch_bytes
                 batch_segments.append(segment)
 
         # Handle final batch
@@ -377,17 +442,16 @@ class DNSChunker:
 
         # Sort chunks by index
         sorted_chunks = sorted(chunks.items())
-        complete_text = ""
+        segments = []
 
         for _, chunk_data in sorted_chunks:
             parts = chunk_data.split(':', 2)
             if len(parts) == 3:
                 encrypted_data = parts[2].encode('ascii')
                 try:
-                    decrypted_segment = crypto_manager.decrypt_chunk(encrypted_data)
-                    complete_text += decrypted_segment
+                    segments.append(crypto_manager.decrypt_chunk(encrypted_data))
                 except Exception:
                     # Skip corrupted chunks
                     continue
 
-        return complete_text
\ No newline at end of file
+        return ''.join(segments)
\ No newline at end of file
@@ -4,7 +4,6 @@ Command-line interface for the DNS-based LLM proxy system.
 
 import os
 import click
-from .server import LLMDNSServer
 from .client import cli as client_cli
 from .crypto import CryptoManager
 
@@ -42,6 +41,10 @@ def server(host, port, openai_base_url, openai_model, generate_key):
     base_url = openai_base_url or os.getenv('OPENAI_BASE_URL')
     model = openai_model or os.getenv('OPENAI_MODEL')
 
+    # The server pulls in dnslib's server and the OpenAI SDK; import it only
+    # when actually starting one so client invocations start faster
+    from .server import LLMDNSServer
+
     click.echo(f"Starting DNS server on {host}:{port}")
     if base_url:
         click.echo(f"Using custom OpenAI base URL: {base_url}")
@@ -2,110 +2,357 @@
 CLI client for the DNS-based LLM proxy system.
 """
 
+import base64
+import json
+import os
+import secrets
+import selectors
 import socket
+import struct
 import time
-import uuid
-import random
-import threading
 import sys
 import click
-from typing import Dict, List, Optional
-from dnslib import DNSRecord, QTYPE, DNSQuestion, DNSHeader
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
 from .crypto import CryptoManager
 #from .native_crypto import CryptoManager
 from .chunking import DNSChunker
 from .version import get_version_string
-from .config import format_dns_query
+from .config import format_dns_query, get_dns_suffix
+
+
+_QTYPE_TXT = 16  # RFC 1035 TXT record type
+
+
+def _skip_name(data: bytes, offset: int) -> int:
+    """Return the offset just past the (possibly compressed) DNS name at offset."""
+    while True:
+        length = data[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:
+            # Compression pointer ends the name
+            return offset + 2
+        offset += 1 + length
+
+
+def _pack_labels(buf: bytearray, offset: int, name: str) -> int:
+    """Write name's length-prefixed labels into buf at offset and return the new offset."""
+    for label in name.split('.'):
+        encoded = label.encode('ascii')
+        length = len(encoded)
+        if not 0 < length <= 63:
+            raise ValueError(f"Invalid DNS label: {label!r}")
+        buf[offset] = length
+        buf[offset + 1:offset + 1 + length] = encoded
+        offset += 1 + length
+    return offset
+
+
+@lru_cache(maxsize=8)
+def _suffix_wire(suffix: str) -> bytes:
+    """Return the wire labels for the DNS suffix (without the root label)."""
+    buf = bytearray(256)
+    return bytes(buf[:_pack_labels(buf, 0, suffix)])
+
+
+def _pack_txt_query(buf: bytearray, qid: int, name: str) -> int:
+    """Pack a recursive TXT/IN query for name into buf and return its length."""
+    # Header: ID, flags (RD), QDCOUNT=1, ANCOUNT, NSCOUNT, ARCOUNT
+    struct.pack_into('>HHHHHH', buf, 0, qid, 0x0100, 1, 0, 0, 0)
+    name = name.rstrip('.')
+    if len(name) > 253:
+        raise ValueError(f"DNS name too long: {len(name)} > 253")
+    # Every query ends in the same suffix, so only the leading labels are
+    # encoded per call and the suffix labels are copied in pre-encoded
+    suffix = get_dns_suffix()
+    if name.endswith(suffix) and name[-len(suffix) - 1:-len(suffix)] == '.':
+        offset = _pack_labels(buf, 12, name[:-len(suffix) - 1])
+        suffix_labels = _suffix_wire(suffix)
+        buf[offset:offset + len(suffix_labels)] = suffix_labels
+        offset += len(suffix_labels)
+    else:
+        offset = _pack_labels(buf, 12, name)
+    # Root label, QTYPE=TXT, QCLASS=IN
+    struct.pack_into('>BHH', buf, offset, 0, _QTYPE_TXT, 1)
+    return offset + 5
+
+
+def _mask_indices(mask: int) -> List[int]:
+    """Return the indices of the set bits in mask, lowest first."""
+    indices = []
+    while mask:
+        low_bit = mask & -mask
+        indices.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return indices
 
 
 class SimpleSpinner:
+    """Spinner drawn from the caller's own wait loops; no background thread."""
+    INTERVAL = 0.1  # Seconds between frames
+
     def __init__(self, message="Loading"):
-        self.message = message
         self.running = False
-        self.thread = None
         self.spinner_chars = "|/-\\"
         self.current = 0
+        self.last_frame = 0.0
+        self.message = message
+
+    @property
+    def message(self) -> str:
+        return self._message
 
-    def _spin(self):
-        while self.running:
-            sys.stdout.write(f"\r{self.message} {self.spinner_chars[self.current % len(self.spinner_chars)]}")
-            sys.stdout.flush()
-            self.current += 1
-            time.sleep(0.1)
-        sys.stdout.write("\r" + " " * (len(self.message) + 2) + "\r")
+    @message.setter
+    def message(self, message: str):
+        # Frames and the erase string only change with the message
+        self._message = message
+        self._frames = [f"\r{message} {char}" for char in self.spinner_chars]
+        self._clear = "\r" + " " * (len(message) + 2) + "\r"
+
+    def tick(self):
+        """Draw the next frame."""
+        if not self.running:
+            return
+        sys.stdout.write(self._frames[self.current % len(self._frames)])
         sys.stdout.flush()
+        self.current += 1
+        self.last_frame = time.monotonic()
+
+    def poll(self):
+        """Draw the next frame if INTERVAL has passed since the last one."""
+        if time.monotonic() - self.last_frame >= self.INTERVAL:
+            self.tick()
+
+    def sleep(self, seconds: float):
+        """Sleep for seconds while animating the spinner."""
+        deadline = time.monotonic() + seconds
+        remaining = seconds
+        while remaining > 0:
+            self.tick()
+            time.sleep(min(self.INTERVAL, remaining))
+            remaining = deadline - time.monotonic()
 
     def start(self):
         self.running = True
-        self.thread = threading.Thread(target=self._spin)
-        self.thread.start()
+        self.tick()
 
     def stop(self):
+        if not self.running:
+            return
         self.running = False
-        if self.thread:
-            self.thread.join()
+        sys.stdout.write(self._clear)
+        sys.stdout.flush()
+
+
+_SO_BUSY_POLL = getattr(socket, 'SO_BUSY_POLL', 46)  # Linux value; not exported by the socket module
+_LOOPBACK_HOSTS = ("127.0.0.1", "localhost")  # The client socket is IPv4 only
 
 
 class DNSLLMClient:
+    SEND_WINDOW = 16  # Queries kept in flight by _send_dns_queries
+    BUSY_POLL_USEC = 50  # Busy-poll budget for loopback servers (Linux only)
+    MIN_POLL_DELAY = 0.005  # First poll delay; backs off towards poll_interval
+
     def __init__(self, server_host: str = "127.0.0.1", server_port: int = 5353, crypto_key: bytes = None, verbose: bool = False, poll_interval: float = 0.1, model: str = "LLM"):
         self.server_host = server_host
         self.server_port = server_port
         self.crypto = CryptoManager(crypto_key)
         self.chunker = DNSChunker()
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if sys.platform.startswith('linux') and server_host in _LOOPBACK_HOSTS:
+            # Against a local server, wakeup latency dominates each round trip;
+            # let the kernel spin briefly for replies instead of sleeping
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, _SO_BUSY_POLL, self.BUSY_POLL_USEC)
+            except OSError:
+                pass
         self.sock.settimeout(30.0)
+        # Connect once so each send skips the per-packet address lookup and
+        # datagrams from any other source are dropped by the kernel
+        try:
+            self.sock.connect((server_host, server_port))
+            self._send_packet = self.sock.send
+        except OSError:
+            # Unresolvable host: fail on each query instead of at construction
+            self._send_packet = lambda data: self.sock.sendto(data, (self.server_host, self.server_port))
         self.verbose = verbose
         self.poll_interval = poll_interval
+        # Animated while this client waits on the network, when set
+        self.spinner: Optional[SimpleSpinner] = None
         self.model = model
         self.client_version = get_version_string()
         # Use a single session ID for the entire client session to avoid collisions
         # Use 3-digit session ID (000-999) for much better uniqueness
         # Mix timestamp and random for collision avoidance
         time_component = int(time.time()) % 1000
-        random_component = uuid.uuid4().int % 1000
+        random_component = secrets.randbelow(1000)
         session_num = (time_component + random_component) % 1000
         self.session_id = f"{session_num:03d}"  # Zero-padded 3 digits
 
+        # Transaction IDs count up from a random start; they only need to be
+        # distinct among queries in flight
+        self._next_qid = int.from_bytes(os.urandom(2), 'big')
+
+        # Every query is packed into the same buffer; 512 bytes covers the
+        # 12-byte header, a maximal 255-byte qname and the question trailer
+        self._query_buf = bytearray(512)
+        # Replies are received into one reusable buffer and parsed in place
+        self._recv_buf = bytearray(4096)
+        self._recv_view = memoryview(self._recv_buf)
+
+    def _sleep(self, seconds: float):
+        """Sleep for seconds, animating the spinner if one is set."""
+        if self.spinner:
+            self.spinner.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def _new_qid(self) -> int:
+        """Return the next transaction ID (1-65535)."""
+        self._next_qid = (self._next_qid + 1) & 0xFFFF or 1
+        return self._next_qid
+
+    def _build_query(self, query_name: str, qid: int) -> bytes:
+        """Pack a TXT query for query_name with transaction ID qid."""
+        length = _pack_txt_query(self._query_buf, qid, query_name)
+        return bytes(memoryview(self._query_buf)[:length])
+
+    @staticmethod
+    def _parse_txt_response(response_data) -> Tuple[int, Optional[str]]:
+        """Parse a DNS response (bytes or memoryview) into (transaction ID, first TXT record or None)."""
+        response_id, _, qdcount, ancount, _, _ = struct.unpack_from('>HHHHHH', response_data, 0)
+
+        # Skip the echoed question section (name, QTYPE, QCLASS)
+        offset = 12
+        for _ in range(qdcount):
+            offset = _skip_name(response_data, offset) + 4
+
+        for _ in range(ancount):
+            offset = _skip_name(response_data, offset)
+            rtype, _, _, rdlength = struct.unpack_from('>HHIH', response_data, offset)
+            offset += 10
+            if rtype == _QTYPE_TXT:
+                # TXT RDATA is a sequence of length-prefixed strings (each ≤255 bytes);
+                # slice through a memoryview so nothing is copied before decoding
+                view = memoryview(response_data)
+                end = offset + rdlength
+                if end > len(response_data):
+                    raise ValueError("Truncated TXT record")
+                if rdlength and response_data[offset] + 1 == rdlength:
+                    # Single string, the usual case for chunk replies
+                    return response_id, str(view[offset + 1:end], 'utf-8', 'ignore')
+                parts = []
+                while offset < end:
+                    length = response_data[offset]
+                    parts.append(view[offset + 1:offset + 1 + length])
+                    offset += 1 + length
+                return response_id, str(b''.join(parts), 'utf-8', 'ignore')
+            offset += rdlength
+
+        return response_id, None
+
     def _send_dns_query(self, query_name: str) -> Optional[str]:
         """Send a DNS query and return the TXT record response."""
         try:
-            # Manual DNS record construction to avoid dnslib issues
-            question = DNSQuestion(query_name, QTYPE.TXT)
-            header = DNSHeader(id=random.randint(1, 65535))
-            q = DNSRecord(header, q=question)
-            query_data = q.pack()
-
-            self.sock.sendto(query_data, (self.server_host, self.server_port))
-
-            response_data, _ = self.sock.recvfrom(4096)
-            response = DNSRecord.parse(response_data)
-
-            for rr in response.rr:
-                if rr.rtype == QTYPE.TXT:
-                    # Handle TXT RDATA which can be a list of strings (each ≤255 bytes)
-                    rdata = rr.rdata
-
-                    # dnslib TXT RDATA has a 'data' attribute that's a list of byte strings
-                    if hasattr(rdata, 'data') and isinstance(rdata.data, list):
-                        # Join all byte strings and decode
-                        txt_bytes = b''.join(rdata.data)
-                        txt_data = txt_bytes.decode('utf-8', errors='ignore')
-                    else:
-                        # Fallback to string conversion
-                        txt_data = str(rdata)
-                        # Handle quoted TXT records
-                        if txt_data.startswith('"') and txt_data.endswith('"'):
-                            txt_data = txt_data[1:-1]
+            qid = self._new_qid()
+            self._send_packet(self._build_query(query_name, qid))
 
+            while True:
+                nbytes = self.sock.recv_into(self._recv_buf)
+                response_id, txt_data = self._parse_txt_response(self._recv_view[:nbytes])
+                # Skip late replies to earlier (pipelined or timed out) queries
+                if response_id == qid:
                     return txt_data
 
+        except Exception as e:
+            if self.verbose:
+                click.echo(f"DNS query error: {e}")
             return None
 
+    def _send_dns_queries(self, query_names: List[str], timeout: float = 2.0,
+                          max_retries: int = 2) -> List[Optional[str]]:
+        """Send several DNS queries keeping up to SEND_WINDOW in flight.
+
+        Replies are matched to queries by transaction ID, and queries that time
+        out are retransmitted up to max_retries times.
+
+        Returns:
+            TXT record responses in the same order as query_names (None on failure)
+        """
+        results: List[Optional[str]] = [None] * len(query_names)
+        pending = deque(range(len(query_names)))
+        inflight: Dict[int, Tuple[int, float, int]] = {}  # qid -> (index, deadline, retries)
+
+        def transmit(qid: int, index: int, retries: int):
+            try:
+                self._send_packet(self._build_query(query_names[index], qid))
+                deadline = time.monotonic() + timeout
+            except OSError:
+                # The connected socket reports an earlier ICMP error on the next
+                # send; count this as an attempt and retry it straight away
+                deadline = time.monotonic()
+            inflight[qid] = (index, deadline, retries)
+
+        spinner = self.spinner
+        selector = selectors.DefaultSelector()
+        selector.register(self.sock, selectors.EVENT_READ)
+        try:
+            while pending or inflight:
+                # Fill the send window
+                while pending and len(inflight) < self.SEND_WINDOW:
+                    index = pending.popleft()
+                    qid = self._new_qid()
+                    while qid in inflight:
+                        qid = self._new_qid()
+                    transmit(qid, index, 0)
+
+                wait = max(0.0, min(deadline for _, deadline, _ in inflight.values()) - time.monotonic())
+                if spinner:
+                    # Wake at least once per frame to keep the spinner moving
+                    spinner.poll()
+                    wait = min(wait, spinner.INTERVAL)
+                if selector.select(wait):
+                    try:
+                        nbytes = self.sock.recv_into(self._recv_buf)
+                    except OSError:
+                        # ICMP port unreachable for one of our datagrams. The server
+                        # may just be restarting, so retransmit what is in flight now;
+                        # queries refused on every retry still fail within max_retries
+                        now = time.monotonic()
+                        for qid, (index, _, retries) in list(inflight.items()):
+                            inflight[qid] = (index, now, retries)
+                        continue
+                    try:
+                        response_id, txt_data = self._parse_txt_response(self._recv_view[:nbytes])
+                    except Exception:
+                        continue
+                    entry = inflight.pop(response_id, None)
+                    if entry is not None:
+                        results[entry[0]] = txt_data
+                    continue
+
+                # Retransmit or give up on queries whose deadline passed
+                now = time.monotonic()
+                for qid, (index, deadline, retries) in list(inflight.items()):
+                    if deadline > now:
+                        continue
+                    if retries < max_retries:
+                        transmit(qid, index, retries + 1)
+                    else:
+                        del inflight[qid]
+                        if self.verbose:
+                            click.echo(f"DNS query timed out: {query_names[index]}")
+
         except Exception as e:
             if self.verbose:
                 click.echo(f"DNS query error: {e}")
-            return None
+        finally:
+            selector.close()
+
+        return results
 
     def send_message(self, message: str, show_spinner: bool = True, streaming: bool = True) -> Optional[str]:
         """Send a message to the LLM through DNS and get the response.
@@ -128,24 +375,26 @@ class DNSLLMClient:
 
             if self.verbose:
                 click.echo(f"Creating message chunks...")
-            chunks = self.chunker.create_chunks(encrypted_data, session_id)
+            # The token is already base64; send its raw bytes so the label
+            # encoding is not applied on top of a second encoding
+            chunks = self.chunker.create_chunks(base64.urlsafe_b64decode(encrypted_data), session_id)
 
             if show_spinner and not self.verbose:
-                spinner = SimpleSpinner("...")
+                spinner = self.spinner = SimpleSpinner("...")
                 spinner.start()
 
             if self.verbose:
                 click.echo(f"Sending {len(chunks)} chunks...")
 
-            for i, chunk in enumerate(chunks):
-                if self.verbose:
-                    click.echo(f"Sending chunk {i+1}/{len(chunks)}")
-                response = self._send_dns_query(chunk)
+            # Chunks are independent, so pipeline them instead of one RTT each
+            responses = self._send_dns_queries(chunks)
+            for i, response in enumerate(responses):
                 if response != "OK" and self.verbose:
                     click.echo(f"Warning: Unexpected response for chunk {i+1}: {response}")
 
             if spinner:
                 spinner.stop()
+                spinner = self.spinner = None
 
             if streaming and not self.verbose:
                 return self._handle_streaming_response(session_id)
@@ -155,19 +404,25 @@ class DNSLLMClient:
         finally:
             if spinner:
                 spinner.stop()
+                self.spinner = None
 
     def _handle_streaming_response(self, session_id: str) -> Optional[str]:
         """Handle streaming response by displaying individual chunks immediately."""
-        import sys
-
-        displayed_chunks = set()  # Track which chunks we've already displayed
+        # Streaming chunks are self-contained tokens; only the last one grows
+        # while the server is still generating, so remember what each index
+        # decrypted to and display just the new tail
+        seen_data: Dict[int, str] = {}  # chunk index -> token last decrypted
+        shown_text: Dict[int, str] = {}  # chunk index -> plaintext already displayed
         final_response = ""
         start_time = time.time()
         max_wait_time = 60  # Maximum wait time in seconds
         last_chunk_time = time.time()
-
-        # Initial wait for processing to start
-        time.sleep(self.poll_interval)
+        # Wait for processing to start. The server's "w." long-poll returns a
+        # response version to wait on next; None means it is unsupported and
+        # plain polling is used instead, backing off from MIN_POLL_DELAY to
+        # poll_interval while nothing changes
+        delay = self.MIN_POLL_DELAY
+        version = self._wait_for_response_update(session_id, 0, delay)
 
         while True:
             # Check for timeout
@@ -191,66 +446,172 @@ class DNSLLMClient:
             response_chunks = self._get_current_response_chunks(session_id)
 
             if not response_chunks:
-                time.sleep(self.poll_interval)
+                delay = min(delay * 1.5, self.poll_interval)
+                version = self._wait_for_response_update(session_id, version, delay)
                 continue
 
-            # Process each new chunk individually and display immediately
+            # Walk chunks in index order and display whatever is new
             new_chunks_found = False
-            for chunk_index, chunk_data in response_chunks.items():
-                if chunk_index not in displayed_chunks:
-                    displayed_chunks.add(chunk_index)
-                    new_chunks_found = True
-                    last_chunk_time = current_time
-
+            chunk_index = 0
+            while chunk_index in response_chunks:
+                chunk_data = response_chunks[chunk_index]
+                encrypted = chunk_data.partition(':')[2].partition(':')[2]
+                if seen_data.get(chunk_index) == encrypted:
+                    chunk_index += 1
+                    continue
+
+                text_key = chunk_index
+                try:
+                    chunk_text = self.crypto.decrypt_chunk(encrypted.encode('ascii'))
+                    seen_data[chunk_index] = encrypted
+                except Exception:
+                    # Not a streaming token: a single response split across
+                    # records, readable once every chunk has arrived
                     try:
-                        # Try to decrypt this individual chunk
-                        parts = chunk_data.split(':', 2)
-                        if len(parts) == 3:
-                            encrypted_data = parts[2].encode('ascii')
-                            try:
-                                # Try streaming chunk decryption
-                                chunk_text = self.crypto.decrypt_chunk(encrypted_data)
-                            except Exception:
-                                # Fall back to regular decryption if chunk method fails
-                                chunk_text = self.crypto.decrypt(encrypted_data)
-
-                            # Display chunk content immediately (remove [EOS] marker)
-                            display_text = chunk_text.replace('[EOS]', '')
-                            if display_text:
-                                sys.stdout.write(display_text)
-                                sys.stdout.flush()
-                                final_response += display_text
-
-                            # Check if this chunk contains [EOS] marker
-                            if '[EOS]' in chunk_text:
-                                if not final_response.endswith('\n'):
-                                    sys.stdout.write('\n')
-                                    sys.stdout.flush()
-                                return final_response.rstrip()
-
+                        chunk_text = self.crypto.decrypt(self.chunker.reassemble_response(response_chunks))
                     except Exception as e:
                         if self.verbose:
                             click.echo(f"\nError decrypting chunk {chunk_index}: {e}")
-                        continue
+                        break
+                    text_key = -1
+                    for index, data in response_chunks.items():
+                        seen_data[index] = data.partition(':')[2].partition(':')[2]
+                    chunk_index = max(response_chunks)
+
+                new_chunks_found = True
+                last_chunk_time = current_time
+
+                previous_text = shown_text.get(text_key, '')
+                new_text = chunk_text[len(previous_text):] if chunk_text.startswith(previous_text) else chunk_text
+                shown_text[text_key] = chunk_text
+
+                # Display chunk content immediately (the [EOS] marker only ever ends the text)
+                display_text = new_text.removesuffix('[EOS]')
+                if display_text:
+                    sys.stdout.write(display_text)
+                    sys.stdout.flush()
+                    final_response += display_text
+
+                # Check if this chunk ends with the [EOS] marker
+                if chunk_text.endswith('[EOS]'):
+                    if not final_response.endswith('\n'):
+                        sys.stdout.write('\n')
+                        sys.stdout.flush()
+                    return final_response.rstrip()
+
+                chunk_index += 1
 
-            if not new_chunks_found:
-                time.sleep(self.poll_interval)
+            delay = self.MIN_POLL_DELAY if new_chunks_found else min(delay * 1.5, self.poll_interval)
+            if not new_chunks_found or version is not None:
+                version = self._wait_for_response_update(session_id, version, delay)
 
         # Return final response (timeout case)
         return final_response.rstrip() if final_response else None
 
+    def _wait_for_response_update(self, session_id: str, version: Optional[int],
+                                  delay: Optional[float] = None) -> Optional[int]:
+        """Block until the server's response for session_id moves past version.
+
+        Returns the new version, or None when the server does not answer "w."
+        queries, in which case this falls back to sleeping for delay
+        (poll_interval by default).
+        """
+        if version is not None:
+            response = self._send_dns_query(format_dns_query("w", session_id, version))
+            if response and response.isdigit():
+                new_version = int(response)
+                if new_version != version:
+                    return new_version
+                # Unchanged: the wait timed out, or the server was too busy to
+                # hold it, so pause before polling again
+                time.sleep(self.poll_interval if delay is None else delay)
+                return version
+        time.sleep(self.poll_interval if delay is None else delay)
+        return None
+
+    def _get_ready_chunks(self, session_id: str) -> Optional[int]:
+        """Ask the server which response chunks are ready for session_id.
+
+        Returns a bitmap of ready chunk indices (0 when nothing is ready), or
+        None when the server does not answer "s." status queries or the
+        answer is out of range.
+        """
+        response = self._send_dns_query(format_dns_query("s", session_id))
+        total_str, sep, mask_str = (response or "").partition(":")
+        if not sep:
+            return None
+        try:
+            total = int(total_str)
+            ready_mask = int(mask_str, 16)
+        except ValueError:
+            return None
+        # Replies are unauthenticated, so never size a mask from an unchecked total
+        if not 0 <= total <= self.chunker.MAX_MESSAGE_CHUNKS:
+            return None
+        return ready_mask & ((1 << total) - 1)
+
+    def _parse_chunk_header(self, response: Optional[str]) -> Optional[Tuple[int, int]]:
+        """Return (index, total) from an "index:total:data" chunk, or None."""
+        if not response or ':' not in response:
+            return None
+        index_str, _, rest = response.partition(':')
+        total_str, sep, _ = rest.partition(':')
+        if not sep:
+            return None
+        try:
+            index, total = int(index_str), int(total_str)
+        except ValueError:
+            index, total = -1, 0
+        if not 0 <= index < total <= self.chunker.MAX_MESSAGE_CHUNKS:
+            if self.verbose:
+                click.echo(f"Error parsing chunk response: {response}")
+            return None
+        return index, total
+
     def _get_current_response_chunks(self, session_id: str) -> dict:
         """Get current response chunks from server."""
         response_chunks = {}
+        received = 0  # Bitmap of the chunk indices in response_chunks
         chunk_index = 0
         max_chunks = 100  # Increased limit for large responses
         total_chunks = None
         consecutive_not_found = 0
         max_consecutive_not_found = 50  # Allow more gaps - server may be generating chunks slowly
 
+        # Only the index changes between fetch queries
+        query_prefix = f"g.{session_id}."
+        query_suffix = f".{get_dns_suffix()}"
+
+        ready_mask = self._get_ready_chunks(session_id)
+        if ready_mask == 0:
+            return response_chunks
+        if ready_mask is not None:
+            # The server told us what it has; fetch exactly those indices
+            ready_chunks = _mask_indices(ready_mask)
+            responses = self._send_dns_queries(
+                [f"{query_prefix}{i}{query_suffix}" for i in ready_chunks])
+            for response in responses:
+                header = self._parse_chunk_header(response)
+                if header is None:
+                    continue
+                current_index, chunk_total = header
+                received |= 1 << current_index
+                response_chunks[current_index] = response
+                if total_chunks is None or chunk_total > total_chunks:
+                    total_chunks = chunk_total
+            # Nothing left to probe for
+            chunk_index = max_chunks
+
+        prefetched: List[Optional[str]] = []
         while chunk_index < max_chunks and consecutive_not_found < max_consecutive_not_found:
-            query = format_dns_query("g", session_id, chunk_index)
-            response = self._send_dns_query(query)
+            if not prefetched:
+                # Fetch the next window of indices in one pipelined burst; once
+                # the total is known, cover it all so the send window stays full
+                batch_end = min(max(chunk_index + self.SEND_WINDOW, total_chunks or 0), max_chunks)
+                prefetched = self._send_dns_queries(
+                    [f"{query_prefix}{i}{query_suffix}" for i in range(chunk_index, batch_end)])
+                prefetched.reverse()
+            response = prefetched.pop()
 
             if response == "NOT_FOUND":
                 consecutive_not_found += 1
@@ -259,33 +620,29 @@ class DNSLLMClient:
             else:
                 consecutive_not_found = 0  # Reset counter on successful retrieval
 
-            if response and ':' in response:
-                parts = response.split(':', 2)
-                if len(parts) == 3:
-                    try:
-                        current_index = int(parts[0])
-                        chunk_total = int(parts[1])
-                        response_chunks[current_index] = response
-
-                        # Update total_chunks if we haven't seen it yet or if it's larger
-                        if total_chunks is None or chunk_total > total_chunks:
-                            total_chunks = chunk_total
-                            # Don't limit max_chunks yet - server might still be generating more
-
-                        # If we have all chunks we expect, we can break early
-                        if total_chunks and len(response_chunks) >= total_chunks:
-                            # Verify we have a contiguous sequence from 0 to total_chunks-1
-                            if all(i in response_chunks for i in range(total_chunks)):
-                                break
-                    except (ValueError, IndexError):
-                        if self.verbose:
-                            click.echo(f"Error parsing chunk response: {response}")
+            header = self._parse_chunk_header(response)
+            if header is not None:
+                current_index, chunk_total = header
+                received |= 1 << current_index
+                response_chunks[current_index] = response
+
+                # Update total_chunks if we haven't seen it yet or if it's larger
+                if total_chunks is None or chunk_total > total_chunks:
+                    total_chunks = chunk_total
+                    # Don't limit max_chunks yet - server might still be generating more
+
+                # If we have a contiguous sequence from 0 to total_chunks-1, break early
+                if total_chunks:
+                    complete = (1 << total_chunks) - 1
+                    if received & complete == complete:
+                        break
 
             chunk_index += 1
 
         # If we know how many chunks we should have, try to wait for missing ones
-        if total_chunks and len(response_chunks) < total_chunks:
-            missing_chunks = [i for i in range(total_chunks) if i not in response_chunks]
+        missing_mask = ((1 << total_chunks) - 1) & ~received if total_chunks else 0
+        if missing_mask:
+            missing_chunks = _mask_indices(missing_mask)
             if self.verbose:
                 click.echo(f"Waiting for {len(missing_chunks)} missing chunks: {missing_chunks}")
 
@@ -299,25 +656,24 @@ class DNSLLMClient:
                     click.echo(f"Retry {retry + 1}/{max_retries}: Requesting {len(missing_chunks)} missing chunks...")
 
                 # Exponential backoff: 0.5, 1.0, 2.0, 4.0, 8.0 seconds
-                import time
                 wait_time = 0.5 * (2 ** retry)
-                time.sleep(wait_time)
+                self._sleep(wait_time)
 
                 # Request specific missing chunks
                 chunks_retrieved_this_round = 0
-                for missing_idx in missing_chunks[:]:
-                    query = format_dns_query("g", session_id, missing_idx)
-                    response = self._send_dns_query(query)
-
+                responses = self._send_dns_queries(
+                    [f"{query_prefix}{i}{query_suffix}" for i in missing_chunks])
+                for missing_idx, response in zip(missing_chunks, responses):
                     if self._validate_chunk_response(response, missing_idx):
                         response_chunks[missing_idx] = response
-                        missing_chunks.remove(missing_idx)
+                        missing_mask &= ~(1 << missing_idx)
                         chunks_retrieved_this_round += 1
                         if self.verbose:
                             click.echo(f"  ✓ Retrieved missing chunk {missing_idx}")
                     elif self.verbose and response and response != "NOT_FOUND":
                         click.echo(f"  ✗ Invalid chunk {missing_idx}: {response[:30]}...")
 
+                missing_chunks = _mask_indices(missing_mask)
                 if self.verbose:
                     click.echo(f"  Retrieved {chunks_retrieved_this_round} chunks this round")
 
@@ -368,54 +724,75 @@ class DNSLLMClient:
         except (ValueError, IndexError):
             return False
 
+    def _decrypt_response(self, response_chunks: Dict[int, str]) -> str:
+        """Decrypt a response sent either as one split token or as one token per chunk."""
+        try:
+            return self.crypto.decrypt(self.chunker.reassemble_response(response_chunks))
+        except Exception:
+            # Streamed responses carry a self-contained token in every chunk
+            if not all(i in response_chunks for i in range(len(response_chunks))):
+                raise ValueError("Response chunks are incomplete")
+            return self.chunker.reassemble_streaming_chunks(self.crypto, response_chunks)
+
+    def _response_complete(self, response_chunks: Dict[int, str]) -> bool:
+        """Check for the [EOS] marker, which always ends the response plaintext.
+
+        Streamed responses only need their last chunk decrypted for this.
+        """
+        last_chunk = response_chunks.get(len(response_chunks) - 1)
+        if last_chunk is None:
+            return False
+        try:
+            encrypted = last_chunk.partition(':')[2].partition(':')[2]
+            return self.crypto.decrypt_chunk(encrypted.encode('ascii')).endswith('[EOS]')
+        except Exception:
+            # A single token split across records only decrypts as a whole
+            try:
+                return self._decrypt_response(response_chunks).endswith('[EOS]')
+            except Exception:
+                return False  # Incomplete, keep trying
+
     def _handle_traditional_response(self, session_id: str, show_spinner: bool) -> Optional[str]:
         """Handle traditional non-streaming response."""
         spinner = None
 
         try:
             if show_spinner and not self.verbose:
-                spinner = SimpleSpinner("-->")
+                spinner = self.spinner = SimpleSpinner("-->")
                 spinner.start()
             elif self.verbose:
                 click.echo("Message sent, waiting for processing...")
 
-            # Wait longer for server to generate response, especially for long responses
-            time.sleep(1)  # Increased wait time for server generation
-
-            if spinner:
-                spinner.stop()
-                spinner = SimpleSpinner("<--")
-                spinner.start()
-            elif self.verbose:
-                click.echo("Retrieving response chunks...")
-
-            # Use the improved chunk retrieval method
-            # Try multiple times until we get a complete response (marked with [EOS])
+            # Probe right away and back off (0.1, 0.2, 0.4 ... capped at 1 s)
+            # until a complete response (marked with [EOS]) arrives
             response_chunks = {}
-            max_attempts = 5
+            max_wait_time = 60  # Maximum wait time in seconds
+            deadline = time.monotonic() + max_wait_time
+            delay = 0.1
 
-            for attempt in range(max_attempts):
+            while True:
                 response_chunks = self._get_current_response_chunks(session_id)
 
                 if response_chunks:
-                    # Try to reassemble and check if it's complete
-                    try:
-                        reassembled = self.chunker.reassemble_response(response_chunks)
-                        if reassembled:
-                            decrypted = self.crypto.decrypt(reassembled)
-                            if '[EOS]' in decrypted:
-                                # Response is complete
-                                break
-                    except Exception:
-                        pass  # Decryption failed, keep trying
+                    if spinner and spinner.message != "<--":
+                        # Same width as "-->", so the next frame overwrites it
+                        spinner.message = "<--"
+                        spinner.tick()
+
+                    if self._response_complete(response_chunks):
+                        break
+
+                if time.monotonic() + delay > deadline:
+                    break
 
-                if attempt < max_attempts - 1:  # Don't sleep on last attempt
-                    if self.verbose:
-                        click.echo(f"Response incomplete, waiting... (attempt {attempt + 1}/{max_attempts})")
-                    time.sleep(2)  # Wait before retrying
+                if self.verbose:
+                    click.echo(f"Response incomplete, retrying in {delay:.1f}s...")
+                self._sleep(delay)
+                delay = min(delay * 2, 1.0)
 
             if spinner:
                 spinner.stop()
+                spinner = self.spinner = None
 
             if not response_chunks:
                 if not self.verbose:
@@ -426,24 +803,21 @@ class DNSLLMClient:
                 click.echo(f"Received {len(response_chunks)} response chunks")
 
             try:
-                complete_encrypted_response = self.chunker.reassemble_response(response_chunks)
-                decrypted_response = self.crypto.decrypt(complete_encrypted_response)
-                return decrypted_response
+                return self._decrypt_response(response_chunks).removesuffix('[EOS]')
             except Exception as e:
                 if self.verbose:
                     click.echo(f"Error decrypting response: {e}")
-                    click.echo(f"Encrypted data length: {len(complete_encrypted_response) if complete_encrypted_response else 0}")
-                    if complete_encrypted_response:
-                        click.echo(f"Encrypted data starts with: {complete_encrypted_response[:50]}")
+                    first_chunk = response_chunks.get(0, '')
+                    click.echo(f"First chunk starts with: {first_chunk[:50]}")
                 return None
 
         finally:
             if spinner:
                 spinner.stop()
+                self.spinner = None
 
     def get_server_info(self) -> Optional[Dict[str, str]]:
         """Get the server version and model info."""
-        import json
         try:
             version_query = format_dns_query("v")
             response = self._send_dns_query(version_query)
@@ -465,25 +839,13 @@ class DNSLLMClient:
     def test_connection(self) -> bool:
         """Test basic connectivity to the DNS server."""
         try:
-            # Try a simple DNS query to test connectivity
+            # Try a simple DNS query to test connectivity, through the select
+            # loop so a spinner keeps moving while it waits
             test_query = format_dns_query("t")
-            question = DNSQuestion(test_query, QTYPE.TXT)
-            header = DNSHeader(id=random.randint(1, 65535))
-            q = DNSRecord(header, q=question)
-            query_data = q.pack()
-
-            # Set shorter timeout for connection test
-            original_timeout = self.sock.gettimeout()
-            self.sock.settimeout(5.0)
+            response = self._send_dns_queries([test_query], timeout=5.0, max_retries=0)[0]
 
-            self.sock.sendto(query_data, (self.server_host, self.server_port))
-            response_data, _ = self.sock.recvfrom(4096)
-
-            # Restore original timeout
-            self.sock.settimeout(original_timeout)
-
-            # If we got any response, connection is working
-            return True
+            # If we got an answer, connection is working
+            return response is not None
         except Exception:
             return False
 
@@ -521,13 +883,14 @@ def chat(server, port, message, verbose, poll_interval, model):
 
     # Test connection first
     if not verbose:
-        spinner = SimpleSpinner("Testing connection")
+        spinner = client.spinner = SimpleSpinner("Testing connection")
         spinner.start()
 
     connection_ok = client.test_connection()
 
     if not verbose:
         spinner.stop()
+        client.spinner = None
 
     if connection_ok:
         # Get server info
@@ -613,13 +976,14 @@ def test_connection(server, port, verbose, poll_interval, model):
 
         # First test basic connectivity
         if not verbose:
-            spinner = SimpleSpinner("Testing basic connectivity")
+            spinner = client.spinner = SimpleSpinner("Testing basic connectivity")
             spinner.start()
 
         basic_connection = client.test_connection()
 
         if not verbose:
             spinner.stop()
+            client.spinner = None
 
         if not basic_connection:
             click.echo("✗ Basic connectivity test failed")
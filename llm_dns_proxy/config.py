@@ -10,6 +10,15 @@ def get_dns_suffix() -> str:
     return os.getenv('LLM_DNS_SUFFIX', '_sonos._udp.local')
 
 
+def get_history_window() -> int:
+    """Get the number of conversation turns sent to the LLM from environment variable or return default."""
+    try:
+        window = int(os.getenv('LLM_HISTORY_WINDOW', '10'))
+    except ValueError:
+        window = 10
+    return max(1, window)
+
+
 def get_dns_suffix_parts() -> list:
     """Get DNS suffix as a list of parts for validation."""
     suffix = get_dns_suffix()
@@ -20,8 +29,7 @@ def format_dns_query(prefix: str, *parts) -> str:
     """Format a complete DNS query with the configured suffix."""
     suffix = get_dns_suffix()
     if parts:
-        middle_parts = '.'.join(str(part) for part in parts)
-        return f"{prefix}.{middle_parts}.{suffix}"
+        return f"{prefix}.{'.'.join(map(str, parts))}.{suffix}"
     else:
         return f"{prefix}.{suffix}"
 
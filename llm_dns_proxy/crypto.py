@@ -2,12 +2,26 @@
 Encryption utilities using Fernet for secure message transport.
 """
 
-import base64
 import os
 import zlib
 from cryptography.fernet import Fernet
 
 
+# Preset zlib dictionary of phrases common in chat turns. Short messages have
+# little internal redundancy, so priming the compressor is worth more than a
+# higher level. zlib puts the most useful strings last. Streams compressed
+# without it still decompress, since zlib only asks for the dictionary when
+# the stream was built with one.
+_ZDICT = (
+    b"function return value example following However, because should would could "
+    b"```python\n```\n\n- **Note:** 1. 2. 3. import def class self print( "
+    b"Here is an example of how you can use this. Let me know if you have any questions! "
+    b"I'm sorry, but I can't help with that. Sure! Here's a short explanation: "
+    b"The main difference between the two is that "
+    b"Hello! How can I help you today? Thank you! What is the "
+    b" the of and to in is that for it with as on this be are you can "
+)
+
 class CryptoManager:
     def __init__(self, key: bytes = None):
         if key is None:
@@ -30,7 +44,8 @@ class CryptoManager:
     def encrypt(self, message: str) -> bytes:
         """Encrypt a message with compression and return raw Fernet token bytes."""
         # Compress first for better efficiency
-        compressed = zlib.compress(message.encode(), level=9)
+        compressor = zlib.compressobj(level=9, zdict=_ZDICT)
+        compressed = compressor.compress(message.encode()) + compressor.flush()
         # Fernet.encrypt() returns URL-safe base64 bytes
         encrypted = self.fernet.encrypt(compressed)
         return encrypted
@@ -40,7 +55,11 @@ class CryptoManager:
         # Decrypt the Fernet token
         decrypted = self.fernet.decrypt(encrypted_data)
         # Decompress the result
-        decompressed = zlib.decompress(decrypted)
+        decompressor = zlib.decompressobj(zdict=_ZDICT)
+        decompressed = decompressor.decompress(decrypted) + decompressor.flush()
+        # flush() hands back whatever it has, so catch a cut-off or padded stream here
+        if not decompressor.eof or decompressor.unused_data:
+            raise ValueError("Incomplete or trailing data in compressed message")
         return decompressed.decode()
 
     def encrypt_chunk(self, text_chunk: str, sequence: int = 0) -> bytes:
@@ -58,6 +77,17 @@ class CryptoManager:
         chunk_data = text_chunk.encode('utf-8')
         return self.fernet.encrypt(chunk_data)
 
+    @staticmethod
+    def encrypted_chunk_length(byte_length: int) -> int:
+        """Length of the token encrypt_chunk() returns for byte_length bytes of UTF-8.
+
+        Fernet tokens are base64 of version (1) + timestamp (8) + IV (16) +
+        PKCS7-padded AES-CBC ciphertext + HMAC (32), so the size is known
+        without encrypting.
+        """
+        raw_length = 1 + 8 + 16 + (byte_length // 16 + 1) * 16 + 32
+        return 4 * ((raw_length + 2) // 3)
+
     def decrypt_chunk(self, encrypted_chunk: bytes) -> str:
         """Decrypt a streaming text chunk.
 
@@ -1,6 +1,32 @@
 import os, json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Dict, Any
-from openai import OpenAI
+from openai import OpenAI, Timeout
+
+try:
+    # Faster parsing and canonicalisation of tool-call arguments
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _loads(raw: str) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _canonical_dumps(obj: Any) -> str:
+    """Serialise obj with sorted keys, for comparing tool-call arguments."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode()
+    return json.dumps(obj, sort_keys=True)
+
+
+# Retry transient API errors (429s, 5xx, dropped connections) a few more times
+# than the SDK default of 2, and give up on a stalled stream after a minute
+# instead of the SDK's ten
+_MAX_RETRIES = 5
+_TIMEOUT = Timeout(60.0, connect=5.0)
+
 
 class LLMProcessor:
     def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, model: Optional[str] = None):
@@ -11,7 +37,7 @@ class LLMProcessor:
         self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
         self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o")
 
-        client_kwargs = {"api_key": self.api_key}
+        client_kwargs = {"api_key": self.api_key, "max_retries": _MAX_RETRIES, "timeout": _TIMEOUT}
         if self.base_url:
             client_kwargs["base_url"] = self.base_url
         self.client = OpenAI(**client_kwargs)
@@ -22,7 +48,9 @@ class LLMProcessor:
         if self.perplexity_api_key:
             self.perplexity_client = OpenAI(
                 api_key=self.perplexity_api_key,
-                base_url="https://api.perplexity.ai"
+                base_url="https://api.perplexity.ai",
+                max_retries=_MAX_RETRIES,
+                timeout=_TIMEOUT
             )
 
         self.tools = []
@@ -44,7 +72,7 @@ class LLMProcessor:
 
     def _execute_tool(self, name: str, raw_args: str) -> str:
         try:
-            args = json.loads(raw_args) if raw_args else {}
+            args = _loads(raw_args) if raw_args else {}
         except Exception as e:
             return json.dumps({"ok": False, "error": f"Invalid tool arguments: {e}", "raw": raw_args})
 
@@ -55,6 +83,32 @@ class LLMProcessor:
 
         return json.dumps({"ok": False, "error": f"Unknown tool: {name}", "args": args})
 
+    def _run_tool_calls(self, messages: List[Any], pending_calls: List[tuple]) -> None:
+        """Run (slot, tool_call_id, name, raw_args) calls and fill messages[slot] with their results.
+
+        Calls are independent network requests, so several run concurrently.
+        """
+        def run(call):
+            _, _, name, raw_args = call
+            return self._execute_tool(name, raw_args)
+
+        if len(pending_calls) > 1:
+            with ThreadPoolExecutor(max_workers=len(pending_calls)) as executor:
+                results = list(executor.map(run, pending_calls))
+        else:
+            results = [run(call) for call in pending_calls]
+
+        for (slot, tool_call_id, _, _), result in zip(pending_calls, results):
+            # Ensure result is a string; try to keep it structured
+            if not isinstance(result, str):
+                result = json.dumps(result)
+            # Keep the tool schema minimal: NO 'name' field here
+            messages[slot] = {
+                "role": "tool",
+                "tool_call_id": tool_call_id,
+                "content": result
+            }
+
     def list_models(self) -> List[str]:
         """List available models from the API."""
         try:
@@ -98,13 +152,18 @@ class LLMProcessor:
         *,
         temperature: float = 1.0,
         max_tokens: int = 3600,
-        max_tool_iterations: int = 6
+        max_tool_iterations: int = 6,
+        cache_key: Optional[str] = None
     ):
         """
         Process a message and yield streaming tokens/chunks.
         Yields either:
         - {'type': 'token', 'content': str} for text tokens
         - {'type': 'complete', 'content': str} for the final complete message
+
+        cache_key, if given, should stay the same across a conversation's turns;
+        it is sent to OpenAI as prompt_cache_key so requests sharing a history
+        prefix are routed to the same prompt cache.
         """
         messages: List[Dict[str, Any]] = []
         if system_prompt:
@@ -119,6 +178,10 @@ class LLMProcessor:
             "max_completion_tokens": max_tokens,
             "stream": True
         }
+        # Only api.openai.com is known to accept the field; other compatible
+        # servers may reject unknown parameters
+        if cache_key and not self.base_url:
+            base_params["extra_body"] = {"prompt_cache_key": cache_key}
 
         tools_enabled_params = dict(base_params)
         if self.tools:
@@ -176,16 +239,17 @@ class LLMProcessor:
                 })
 
                 duplicate = False
+                pending_calls = []
                 for tc in tool_calls:
                     if tc is None:
                         continue
                     name = tc['function']['name']
                     raw_args = tc['function']['arguments'] or "{}"
                     try:
-                        args_obj = json.loads(raw_args) if raw_args else {}
+                        args_obj = _loads(raw_args) if raw_args else {}
                     except Exception:
                         args_obj = {"_raw": raw_args}
-                    canonical_args = json.dumps(args_obj, sort_keys=True)
+                    canonical_args = _canonical_dumps(args_obj)
                     key = (name, canonical_args)
 
                     if key in seen_calls:
@@ -204,15 +268,11 @@ class LLMProcessor:
                         continue
 
                     seen_calls.add(key)
-                    result = self._execute_tool(name, raw_args)
-                    if not isinstance(result, str):
-                        result = json.dumps(result)
+                    # Reserve the tool message's slot; filled once all new calls have run
+                    pending_calls.append((len(messages), tc['id'], name, raw_args))
+                    messages.append(None)
 
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tc['id'],
-                        "content": result
-                    })
+                self._run_tool_calls(messages, pending_calls)
 
                 synth_params = dict(base_params)
                 messages.append({
@@ -331,14 +391,15 @@ class LLMProcessor:
 
                 # Execute each tool call
                 duplicate = False
+                pending_calls = []
                 for tc in tool_calls:
                     name = tc.function.name
                     raw_args = tc.function.arguments or "{}"
                     try:
-                        args_obj = json.loads(raw_args) if raw_args else {}
+                        args_obj = _loads(raw_args) if raw_args else {}
                     except Exception:
                         args_obj = {"_raw": raw_args}
-                    canonical_args = json.dumps(args_obj, sort_keys=True)
+                    canonical_args = _canonical_dumps(args_obj)
                     key = (name, canonical_args)
 
                     if key in seen_calls:
@@ -359,17 +420,11 @@ class LLMProcessor:
 
                     seen_calls.add(key)
 
-                    result = self._execute_tool(name, raw_args)
-                    # Ensure result is a string; try to keep it structured
-                    if not isinstance(result, str):
-                        result = json.dumps(result)
-
-                    # Keep the tool schema minimal: NO 'name' field here
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tc.id,
-                        "content": result
-                    })
+                    # Reserve the tool message's slot; filled once all new calls have run
+                    pending_calls.append((len(messages), tc.id, name, raw_args))
+                    messages.append(None)
+
+                self._run_tool_calls(messages, pending_calls)
 
                 # (B) Force a synthesis pass with tools disabled so the model must use results
                 synth_params = dict(base_params)  # no tools / no tool_choice
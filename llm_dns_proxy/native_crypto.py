@@ -1,6 +1,8 @@
 """
 Pure-Python symmetric encryption: ChaCha20 + HMAC-SHA256 (encrypt-then-MAC)
-No third-party libraries. Drop-in compatible with the CryptoManager interface
+No third-party libraries required (pybase64 is used for token encoding and
+cryptography's OpenSSL ChaCha20 for the keystream when installed). Drop-in
+compatible with the CryptoManager interface
 you posted (same method names and return types), but NOT Fernet-token compatible.
 
 Token format (before base64): b"CH20" || nonce(12) || ciphertext || tag(32)
@@ -10,12 +12,26 @@ import os
 import hmac
 import base64
 import struct
-import hashlib
+from functools import lru_cache
 from typing import Tuple
 
+try:
+    # SIMD-accelerated drop-in for the stdlib base64 codecs
+    import pybase64 as _b64
+except ImportError:
+    _b64 = base64
+
+try:
+    # OpenSSL's vectorised ChaCha20 and HKDF; same output as the Python fallbacks below
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+except ImportError:
+    Cipher = HKDF = None
+
 def _hkdf_extract(salt: bytes, ikm: bytes) -> bytes:
     # HKDF-Extract with SHA-256
-    return hmac.new(salt if salt is not None else b"\x00" * 32, ikm, hashlib.sha256).digest()
+    return hmac.digest(salt if salt is not None else b"\x00" * 32, ikm, "sha256")
 
 def _hkdf_expand(prk: bytes, info: bytes, length: int) -> bytes:
     # HKDF-Expand with SHA-256
@@ -23,12 +39,14 @@ def _hkdf_expand(prk: bytes, info: bytes, length: int) -> bytes:
     t = b""
     counter = 1
     while len(out) < length:
-        t = hmac.new(prk, t + info + bytes([counter]), hashlib.sha256).digest()
+        t = hmac.digest(prk, t + info + bytes([counter]), "sha256")
         out += t
         counter += 1
     return out[:length]
 
 def hkdf_sha256(ikm: bytes, salt: bytes, info: bytes, length: int) -> bytes:
+    if HKDF is not None:
+        return HKDF(algorithm=hashes.SHA256(), length=length, salt=salt, info=info).derive(ikm)
     prk = _hkdf_extract(salt, ikm)
     return _hkdf_expand(prk, info, length)
 
@@ -78,13 +96,26 @@ def _chacha20_block(key32: bytes, counter: int, nonce12: bytes) -> bytes:
 
 def chacha20_xor(key32: bytes, nonce12: bytes, plaintext: bytes, counter_start: int = 1) -> bytes:
     # XOR plaintext with ChaCha20 keystream
-    out = bytearray()
+    if Cipher is not None:
+        # OpenSSL takes the RFC 7539 block counter and nonce as one 16-byte value
+        full_nonce = struct.pack("<I", counter_start) + nonce12
+        encryptor = Cipher(algorithms.ChaCha20(key32, full_nonce), mode=None).encryptor()
+        return encryptor.update(plaintext) + encryptor.finalize()
+    return _chacha20_xor_py(key32, nonce12, plaintext, counter_start)
+
+def _chacha20_xor_py(key32: bytes, nonce12: bytes, plaintext: bytes, counter_start: int = 1) -> bytes:
+    # Pure-Python keystream XOR, used when cryptography is not installed
+    out = bytearray(len(plaintext))
+    view = memoryview(plaintext)
     counter = counter_start
     for block_start in range(0, len(plaintext), 64):
         block = _chacha20_block(key32, counter, nonce12)
         counter = (counter + 1) & 0xffffffff
-        chunk = plaintext[block_start:block_start+64]
-        out.extend(bytes(a ^ b for a, b in zip(chunk, block[:len(chunk)])))
+        chunk = view[block_start:block_start+64]
+        n = len(chunk)
+        # One bignum XOR per block instead of a Python loop over its bytes
+        out[block_start:block_start+n] = (
+            int.from_bytes(chunk, "little") ^ int.from_bytes(block[:n], "little")).to_bytes(n, "little")
     return bytes(out)
 
 # --- Encrypt-then-MAC (AEAD-like) ---
@@ -94,20 +125,26 @@ NONCE_LEN = 12
 TAG_LEN = 32
 KEY_LEN = 32           # 256-bit master key
 
+# Every token's base64 starts with these characters (MAGIC's first 30 bits) and
+# is at least this long, so malformed input is rejected before decoding
+_B64_MAGIC_PREFIX = base64.urlsafe_b64encode(MAGIC)[:5]
+_MIN_B64_TOKEN_LEN = (len(MAGIC) + NONCE_LEN + TAG_LEN + 2) // 3 * 4
+
+@lru_cache(maxsize=8)
 def _split_keys(master_key: bytes) -> Tuple[bytes, bytes]:
-    # Derive separate keys for encryption and MAC
+    # Derive separate keys for encryption and MAC (once per master key)
     okm = hkdf_sha256(master_key, salt=b"chacha20+hmac", info=b"enc+mac", length=64)
     return okm[:32], okm[32:]
 
 def _mac(mac_key: bytes, nonce: bytes, ciphertext: bytes) -> bytes:
     # MAC over associated data = MAGIC || nonce || ciphertext
-    return hmac.new(mac_key, MAGIC + nonce + ciphertext, hashlib.sha256).digest()
+    return hmac.digest(mac_key, MAGIC + nonce + ciphertext, "sha256")
 
 def _b64u_encode(b: bytes) -> bytes:
-    return base64.urlsafe_b64encode(b)
+    return _b64.urlsafe_b64encode(b)
 
 def _b64u_decode(b: bytes) -> bytes:
-    return base64.urlsafe_b64decode(b)
+    return _b64.urlsafe_b64decode(b)
 
 class CryptoManager:
     def __init__(self, key: bytes = None):
@@ -127,7 +164,7 @@ class CryptoManager:
         else:
             # Try to interpret provided bytes as base64; if it decodes to 32 bytes, use it.
             try:
-                decoded = base64.urlsafe_b64decode(key)
+                decoded = _b64u_decode(key)
                 if len(decoded) == KEY_LEN:
                     key = decoded
             except Exception:
@@ -170,6 +207,11 @@ class CryptoManager:
         if isinstance(encrypted_data, str):
             encrypted_data = encrypted_data.encode("utf-8")
 
+        if len(encrypted_data) < _MIN_B64_TOKEN_LEN:
+            raise ValueError("Invalid token (too short)")
+        if not encrypted_data.startswith(_B64_MAGIC_PREFIX):
+            raise ValueError("Invalid token (magic)")
+
         try:
             blob = _b64u_decode(encrypted_data)
         except Exception as e:
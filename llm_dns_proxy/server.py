@@ -2,9 +2,19 @@
 DNS server that handles encrypted LLM queries through DNS TXT records.
 """
 
+import base64
+import hashlib
+import heapq
+import itertools
+import json
 import logging
+import re
 import socket
 import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Dict, Optional, List
 from dnslib import DNSRecord, DNSHeader, QTYPE, RR, TXT
 from dnslib.server import DNSServer, BaseResolver
@@ -13,184 +23,314 @@ from .crypto import CryptoManager
 from .chunking import DNSChunker
 from .llm import LLMProcessor
 from .version import get_version_string
-from .config import get_dns_suffix
+from .config import get_dns_suffix, get_history_window
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Words with their trailing whitespace, as streamed text is segmented
+_WORD_RE = re.compile(r'\s*\S+\s*|\s+')
+
+# Fixed answers, shared across replies since dnslib never modifies rdata
+_OK_TXT = TXT("OK")
+_NOT_FOUND_TXT = TXT("NOT_FOUND")
+
+
+class _DelayedCalls:
+    """Run short delayed callbacks on one shared daemon thread, started on first use."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._queue = []  # Heap of (due time, tiebreak, callback)
+        self._order = itertools.count()
+        self._changed = threading.Condition()
+        self._thread = None
+
+    def call_later(self, delay: float, callback):
+        """Call callback on the shared thread once delay seconds have passed."""
+        with self._changed:
+            heapq.heappush(self._queue, (time.monotonic() + delay, next(self._order), callback))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._changed.notify()
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while not self._queue or self._queue[0][0] > time.monotonic():
+                    self._changed.wait(self._queue[0][0] - time.monotonic() if self._queue else None)
+                _, _, callback = heapq.heappop(self._queue)
+            try:
+                callback()
+            except Exception as e:
+                logger.error("Error in delayed call: %s", e)
+
+
+@lru_cache(maxsize=8)
+def _suffix_labels(suffix: str) -> tuple:
+    """Return the DNS suffix as lowercased label bytes, as dnslib splits names."""
+    return tuple(label.lower().encode('idna') for label in suffix.split('.'))
+
 
 class LLMDNSResolver(BaseResolver):
+    WAIT_TIMEOUT = 5.0  # Longest a "w." query is held open before answering
+    MAX_WAITERS = 128  # "w." queries held open at once; each pins a server thread
+    MAX_CACHED_RESPONSES = 10000  # Sessions whose response chunks are kept
+    RESPONSE_TTL = 300.0  # Seconds a response is kept after its last update
+    MAX_CONVERSATIONS = 5000  # Clients whose conversation history is kept
+    STREAM_PUBLISH_INTERVAL = 0.02  # Shortest gap between streamed chunk updates
+    MAX_STREAM_WORKERS = 32  # LLM responses streamed concurrently; later ones queue
+
     def __init__(self, crypto_key: bytes = None, openai_api_key: str = None,
                  openai_base_url: str = None, openai_model: str = None):
         self.crypto = CryptoManager(crypto_key)
         self.chunker = DNSChunker()
         self.llm = LLMProcessor(openai_api_key, openai_base_url, openai_model)
-        self.response_cache: Dict[str, Dict[int, str]] = {}
-        # Conversation state management (maps client IP to conversation history)
-        self.conversations: Dict[str, List[Dict[str, str]]] = {}
+        # Ordered oldest update first, so expiry and eviction pop from the front
+        self.response_cache: "OrderedDict[str, Dict[int, str]]" = OrderedDict()
+        self.response_stored_at: Dict[str, float] = {}
+        # Conversation state management (maps client IP to conversation history),
+        # ordered least recently updated first so idle clients are evicted first
+        self.conversations: "OrderedDict[str, List[Dict[str, str]]]" = OrderedDict()
+        # Keep at most LLM_HISTORY_WINDOW turns (user + assistant message each),
+        # trimming back to about half of that once the window is exceeded
+        history_window = get_history_window()
+        self.max_history_messages = 2 * history_window
+        self.history_trim_to = 2 * max(1, history_window // 2)
         self.lock = threading.Lock()
+        # Bumped on every response_cache update so "w." queries can wait for changes
+        self.response_versions: Dict[str, int] = {}
+        self.response_updated = threading.Condition(self.lock)
+        self.wait_slots = threading.BoundedSemaphore(self.MAX_WAITERS)
+        # Streams run on a shared pool rather than a new thread per message
+        self.stream_executor = ThreadPoolExecutor(max_workers=self.MAX_STREAM_WORKERS,
+                                                  thread_name_prefix="llm-stream")
+        # Delayed flushes of coalesced stream words, all on one thread
+        self.stream_flushes = _DelayedCalls("llm-stream-flush")
         self.version = get_version_string()
         self.model_name = openai_model or "gpt-4o"  # Default model if not specified
+        # Query handlers keyed by their lowercased "<opcode>." prefix
+        self.query_handlers = {
+            'm.': self._handle_message_chunk,  # message chunks
+            'g.': self._handle_response_request,  # get response chunks
+            'w.': self._handle_wait_request,  # wait for response updates
+            's.': self._handle_status_request,  # response status
+            'v.': self._handle_version_request,  # version info
+            't.': self._handle_test_request,  # test connection
+        }
+        # Chat commands matched exactly; /model and /history take arguments
+        self.command_handlers = {
+            '/clear': self._cmd_clear,
+            '/reset': self._cmd_clear,
+            '/list': self._cmd_list,
+            '/help': self._cmd_help,
+        }
+
+    @property
+    def model_name(self) -> str:
+        return self._model_name
+
+    @model_name.setter
+    def model_name(self, value: str):
+        # The "v." answer only changes with the model, so build it here once
+        self._model_name = value
+        self._version_txt = TXT(json.dumps({"version": self.version, "model": value}))
 
     def resolve(self, request, handler):
         """
         Resolve DNS queries for the LLM proxy system.
         """
         reply = request.reply()
-        qname = str(request.q.qname)
-
-        # Handle case-insensitive domain matching but preserve case for data
-        dns_suffix = get_dns_suffix()
-        if qname.lower().endswith(f'.{dns_suffix}.'):
-            qname = qname[:-1]  # Remove trailing dot
-
-        logger.info(f"Received query: {qname}")
-
-        qname_lower = qname.lower()
-        if qname_lower.startswith('m.'):  # message chunks
-            return self._handle_message_chunk(request, reply, qname, handler)
-        elif qname_lower.startswith('g.'):  # get response chunks
-            return self._handle_response_request(request, reply, qname)
-        elif qname_lower.startswith('v.'):  # version info
-            return self._handle_version_request(request, reply)
-        elif qname_lower.startswith('t.'):  # test connection
-            return self._handle_test_request(request, reply)
-        else:
-            logger.warning(f"Unknown query type: {qname}")
+
+        # Reject names outside our suffix on dnslib's label tuple, before paying
+        # for the dotted string. Matching is case-insensitive but the data labels
+        # keep their case; only the suffix and opcode are ever case-folded
+        suffix_labels = _suffix_labels(get_dns_suffix())
+        labels = request.q.qname.label
+        if (len(labels) <= len(suffix_labels)
+                or tuple(label.lower() for label in labels[-len(suffix_labels):]) != suffix_labels):
+            logger.debug("Ignoring query outside the DNS suffix: %s", request.q.qname)
+            return reply
+
+        qname = str(request.q.qname)[:-1]  # Remove trailing dot
+
+        logger.info("Received query: %s", qname)
+
+        query_handler = self.query_handlers.get(qname[:2].lower())
+        if query_handler is None:
+            logger.warning("Unknown query type: %s", qname)
             return reply
+        return query_handler(request, reply, qname, handler)
+
+    def _store_response(self, session_id: str, chunks: Dict[int, str]):
+        """Publish a session's response chunks and wake clients waiting on it.
+
+        chunks must not be modified afterwards: readers use the published dict
+        without taking the lock, so updates always publish a new one.
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.response_cache[session_id] = chunks
+            self.response_cache.move_to_end(session_id)
+            self.response_stored_at[session_id] = now
+            self.response_versions[session_id] = self.response_versions.get(session_id, 0) + 1
+
+            # Drop sessions past RESPONSE_TTL or beyond MAX_CACHED_RESPONSES
+            while self.response_cache:
+                oldest = next(iter(self.response_cache))
+                if (len(self.response_cache) <= self.MAX_CACHED_RESPONSES
+                        and now - self.response_stored_at[oldest] <= self.RESPONSE_TTL):
+                    break
+                del self.response_cache[oldest]
+                del self.response_stored_at[oldest]
+                self.response_versions.pop(oldest, None)
+
+            self.response_updated.notify_all()
 
     def _handle_message_chunk(self, request, reply, qname, handler=None):
         """Handle incoming message chunks."""
-        session_id, complete_data = self.chunker.process_chunk_query(qname)
+        # Chunks of one message may arrive concurrently on different handler threads
+        with self.lock:
+            session_id, complete_data = self.chunker.process_chunk_query(qname)
 
         if session_id is None:
-            logger.error(f"Invalid chunk query: {qname}")
+            logger.error("Invalid chunk query: %s", qname)
             return reply
 
         if complete_data is not None:
-            logger.info(f"Complete message received for session {session_id}")
+            logger.info("Complete message received for session %s", session_id)
 
             # Get client IP for conversation tracking
             client_ip = handler.client_address[0] if handler and hasattr(handler, 'client_address') else "unknown"
 
             try:
-                decrypted_message = self.crypto.decrypt(complete_data)
-                logger.info(f"Decrypted message: {decrypted_message[:100]}...")
-
-                # Check for special commands
-                command = decrypted_message.lower().strip()
-                if command in ['/clear', '/reset']:
-                    # Clear conversation history
-                    with self.lock:
-                        self.conversations[client_ip] = []
-                    llm_response = ">>> Conversation History Reset.[EOS]"
-                    logger.info(f"Cleared conversation history for client {client_ip}")
-
-                    # Create response chunks for the clear message
+                # Clients send the raw token bytes; restore the base64 token form
+                decrypted_message = self.crypto.decrypt(base64.urlsafe_b64encode(complete_data))
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("Decrypted message: %s...", decrypted_message[:100])
+
+                # Check for special commands; only messages starting with "/" can
+                # be one, so ordinary chat skips the case folding and lookups
+                llm_response = None
+                command = decrypted_message.strip()
+                if command.startswith('/'):
+                    command = command.lower()
+                    command_handler = self.command_handlers.get(command)
+                    if command_handler is not None:
+                        llm_response = command_handler(client_ip)
+                    elif command.startswith('/model '):
+                        llm_response = self._cmd_model(client_ip, command[7:].strip())  # Remove '/model ' prefix
+                    elif command.startswith('/history'):
+                        llm_response = self._cmd_history(client_ip, command.split()[1:])
+
+                if llm_response is not None:
+                    # Command replies are complete, so send them in one encrypted piece
                     encrypted_response = self.crypto.encrypt(llm_response)
                     response_chunks = self.chunker.create_response_chunks(encrypted_response, session_id)
 
+                    self._store_response(session_id, response_chunks)
+
+                else:
+                    # Get conversation history for this client
                     with self.lock:
-                        self.response_cache[session_id] = response_chunks
+                        conversation_history = self.conversations.get(client_ip, []).copy()
+                        logger.info("Client %s has %s messages in history", client_ip, len(conversation_history))
 
-                elif command == '/list':
-                    # List available models
-                    models = self.llm.list_models()
-                    current_model = self.llm.get_current_model()
+                    # Process message with conversation context (streaming)
+                    self._process_streaming_response(decrypted_message, session_id, conversation_history, client_ip)
 
-                    if models and models[0].startswith("Error"):
-                        llm_response = f">>> Error listing models: {models[0]}\n\nCurrent model: {current_model}[EOS]"
-                    else:
-                        model_list = "\n".join([f"{'* ' if model == current_model else '  '}{model}" for model in models])
-                        llm_response = f">>> Available models:\n{model_list}\n\ncurrent model ({current_model}). Use /model <name> to switch.[EOS]"
+            except Exception as e:
+                logger.error("Error processing message: %s", e)
+                error_response = f"Error: {str(e)}[EOS]"
+                encrypted_error = self.crypto.encrypt(error_response)
+                error_chunks = self.chunker.create_response_chunks(encrypted_error, session_id)
 
-                    logger.info(f">>> Listed models for client {client_ip}")
+                self._store_response(session_id, error_chunks)
 
-                    # Create response chunks for the model list
-                    encrypted_response = self.crypto.encrypt(llm_response)
-                    response_chunks = self.chunker.create_response_chunks(encrypted_response, session_id)
+        txt_record = _OK_TXT
+        reply.add_answer(RR(request.q.qname, QTYPE.TXT, rdata=txt_record, ttl=60))
+        return reply
 
-                    with self.lock:
-                        self.response_cache[session_id] = response_chunks
-
-                elif command.startswith('/model '):
-                    # Switch model
-                    new_model = command[7:].strip()  # Remove '/model ' prefix
-
-                    if not new_model:
-                        llm_response = "Usage: /model <model_name>\nUse /list to see available models[EOS]"
-                    else:
-                        success = self.llm.set_model(new_model)
-                        if success:
-                            # Update server's stored model name
-                            self.model_name = new_model
-                            llm_response = f">>> Using model: {new_model}[EOS]"
-                            logger.info(f">>> Client {client_ip} switched model to {new_model}")
-                        else:
-                            current_model = self.llm.get_current_model()
-                            llm_response = f">>> Failed to switch to model: {new_model}\nCurrent model remains: {current_model}\nUse /list to see available models[EOS]"
-
-                    # Create response chunks for the model switch response
-                    encrypted_response = self.crypto.encrypt(llm_response)
-                    response_chunks = self.chunker.create_response_chunks(encrypted_response, session_id)
+    def _cmd_clear(self, client_ip: str) -> str:
+        """/clear and /reset: forget the client's conversation history."""
+        with self.lock:
+            self.conversations.pop(client_ip, None)
+        logger.info("Cleared conversation history for client %s", client_ip)
+        return ">>> Conversation History Reset.[EOS]"
 
-                    with self.lock:
-                        self.response_cache[session_id] = response_chunks
-
-                elif command.startswith('/history'):
-                    # Show conversation history
-                    parts = command.split()
-                    message_count = None
-
-                    # Parse optional message count parameter
-                    if len(parts) > 1:
-                        try:
-                            message_count = int(parts[1])
-                        except ValueError:
-                            llm_response = "Usage: /history [count]\nExample: /history 5 to show last 5 messages[EOS]"
-                            encrypted_response = self.crypto.encrypt(llm_response)
-                            response_chunks = self.chunker.create_response_chunks(encrypted_response, session_id)
-
-                            with self.lock:
-                                self.response_cache[session_id] = response_chunks
-                            return reply
+    def _cmd_list(self, client_ip: str) -> str:
+        """/list: show the available models, marking the current one."""
+        models = self.llm.list_models()
+        current_model = self.llm.get_current_model()
 
-                    with self.lock:
-                        conversation_history = self.conversations.get(client_ip, []).copy()
+        if models and models[0].startswith("Error"):
+            llm_response = f">>> Error listing models: {models[0]}\n\nCurrent model: {current_model}[EOS]"
+        else:
+            model_list = "\n".join([f"{'* ' if model == current_model else '  '}{model}" for model in models])
+            llm_response = f">>> Available models:\n{model_list}\n\ncurrent model ({current_model}). Use /model <name> to switch.[EOS]"
 
-                    if not conversation_history:
-                        llm_response = ">>> No conversation history found[EOS]"
-                    else:
-                        # Apply message count limit if specified
-                        if message_count is not None:
-                            conversation_history = conversation_history[-message_count:]
+        logger.info(">>> Listed models for client %s", client_ip)
+        return llm_response
 
-                        # Format history for display
-                        history_lines = []
-                        for i, msg in enumerate(conversation_history):
-                            role = "User" if msg["role"] == "user" else "Assistant"
-                            content = msg["content"]
-                            history_lines.append(f"{i+1}. {role}: {content}")
+    def _cmd_model(self, client_ip: str, new_model: str) -> str:
+        """/model <name>: switch the model used for all clients."""
+        if not new_model:
+            return "Usage: /model <model_name>\nUse /list to see available models[EOS]"
 
-                        total_messages = len(self.conversations.get(client_ip, []))
-                        shown_count = len(conversation_history)
+        success = self.llm.set_model(new_model)
+        if success:
+            # Update server's stored model name
+            self.model_name = new_model
+            logger.info(">>> Client %s switched model to %s", client_ip, new_model)
+            return f">>> Using model: {new_model}[EOS]"
 
-                        llm_response = f">>> Chat History (showing {shown_count} of {total_messages} messages):\n\n"
-                        llm_response += "\n\n".join(history_lines) + "[EOS]"
+        current_model = self.llm.get_current_model()
+        return f">>> Failed to switch to model: {new_model}\nCurrent model remains: {current_model}\nUse /list to see available models[EOS]"
 
-                    logger.info(f"Showed chat history to client {client_ip} ({message_count} messages requested)")
+    def _cmd_history(self, client_ip: str, args: List[str]) -> str:
+        """/history [count]: show the client's conversation history."""
+        message_count = None
 
-                    # Create response chunks for the history
-                    encrypted_response = self.crypto.encrypt(llm_response)
-                    response_chunks = self.chunker.create_response_chunks(encrypted_response, session_id)
+        # Parse optional message count parameter
+        if args:
+            try:
+                message_count = int(args[0])
+            except ValueError:
+                return "Usage: /history [count]\nExample: /history 5 to show last 5 messages[EOS]"
 
-                    with self.lock:
-                        self.response_cache[session_id] = response_chunks
+        with self.lock:
+            conversation_history = self.conversations.get(client_ip, []).copy()
 
-                elif command == '/help':
-                    # Show help information
-                    help_text = """Available Commands:
+        if not conversation_history:
+            llm_response = ">>> No conversation history found[EOS]"
+        else:
+            total_messages = len(conversation_history)
+
+            # Apply message count limit if specified
+            if message_count is not None:
+                conversation_history = conversation_history[-message_count:]
+
+            # Format history for display
+            history_lines = []
+            for i, msg in enumerate(conversation_history):
+                role = "User" if msg["role"] == "user" else "Assistant"
+                content = msg["content"]
+                history_lines.append(f"{i+1}. {role}: {content}")
+
+            shown_count = len(conversation_history)
+
+            llm_response = f">>> Chat History (showing {shown_count} of {total_messages} messages):\n\n"
+            llm_response += "\n\n".join(history_lines) + "[EOS]"
+
+        logger.info("Showed chat history to client %s (%s messages requested)", client_ip, message_count)
+        return llm_response
+
+    def _cmd_help(self, client_ip: str) -> str:
+        """/help: list the chat commands."""
+        logger.info("Showed help to client %s", client_ip)
+        return """Available Commands:
 
 /help           - Show this help message
 /clear          - Clear conversation history and start fresh
@@ -209,74 +349,90 @@ Examples:
 
 Current model: """ + self.model_name + "[EOS]"
 
-                    logger.info(f"Showed help to client {client_ip}")
+    def _handle_response_request(self, request, reply, qname, handler=None):
+        """Handle requests for response chunks."""
+        session_id, chunk_index = self.chunker.parse_response_query(qname)
 
-                    # Create response chunks for the help message
-                    encrypted_response = self.crypto.encrypt(help_text)
-                    response_chunks = self.chunker.create_response_chunks(encrypted_response, session_id)
+        if session_id is None or chunk_index is None:
+            logger.error("Invalid response query: %s", qname)
+            return reply
 
-                    with self.lock:
-                        self.response_cache[session_id] = response_chunks
+        # No lock needed: published chunk dicts are never mutated, only replaced
+        chunks = self.response_cache.get(session_id)
+        chunk_data = chunks.get(chunk_index) if chunks else None
+        if chunk_data is not None:
+            txt_record = TXT(chunk_data)
+            reply.add_answer(RR(request.q.qname, QTYPE.TXT, rdata=txt_record, ttl=60))
+            logger.info("Served chunk %s for session %s", chunk_index, session_id)
+        else:
+            logger.warning("Chunk not found: session=%s, chunk=%s", session_id, chunk_index)
+            txt_record = _NOT_FOUND_TXT
+            reply.add_answer(RR(request.q.qname, QTYPE.TXT, rdata=txt_record, ttl=60))
 
-                else:
-                    # Get conversation history for this client
-                    with self.lock:
-                        conversation_history = self.conversations.get(client_ip, []).copy()
-                        logger.info(f"Client {client_ip} has {len(conversation_history)} messages in history")
+        return reply
 
-                    # Process message with conversation context (streaming)
-                    self._process_streaming_response(decrypted_message, session_id, conversation_history, client_ip)
+    def _handle_wait_request(self, request, reply, qname, handler=None):
+        """Hold a w.sessionid.version query until the session's response changes.
 
-            except Exception as e:
-                logger.error(f"Error processing message: {e}")
-                error_response = f"Error: {str(e)}[EOS]"
-                encrypted_error = self.crypto.encrypt(error_response)
-                error_chunks = self.chunker.create_response_chunks(encrypted_error, session_id)
+        Answers with the current response version, or the unchanged one after
+        WAIT_TIMEOUT, so clients can block here instead of polling chunks.
+        Unknown sessions, and queries beyond MAX_WAITERS, are answered at once.
+        """
+        session_id, known_version = self.chunker.parse_response_query(qname, 'w')
 
-                with self.lock:
-                    self.response_cache[session_id] = error_chunks
+        if session_id is None or known_version is None:
+            logger.error("Invalid wait query: %s", qname)
+            return reply
 
-        txt_record = TXT("OK")
-        reply.add_answer(RR(request.q.qname, QTYPE.TXT, rdata=txt_record, ttl=60))
+        with self.response_updated:
+            version = self.response_versions.get(session_id)
+        if version == known_version:
+            if self.wait_slots.acquire(blocking=False):
+                try:
+                    with self.response_updated:
+                        self.response_updated.wait_for(
+                            lambda: self.response_versions.get(session_id, 0) != known_version,
+                            timeout=self.WAIT_TIMEOUT)
+                        version = self.response_versions.get(session_id, 0)
+                finally:
+                    self.wait_slots.release()
+            else:
+                logger.warning("Too many waiting queries, answering %s at once", qname)
+        elif version is None:
+            version = 0
+
+        reply.add_answer(RR(request.q.qname, QTYPE.TXT, rdata=TXT(str(version)), ttl=0))
         return reply
 
-    def _handle_response_request(self, request, reply, qname):
-        """Handle requests for response chunks."""
-        session_id, chunk_index = self.chunker.parse_response_query(qname)
+    def _handle_status_request(self, request, reply, qname, handler=None):
+        """Report which response chunks a session has ready.
 
-        if session_id is None or chunk_index is None:
-            logger.error(f"Invalid response query: {qname}")
+        Answers "total:bitmap_hex" so clients fetch only the indices that
+        exist instead of probing for them; "0:0" means nothing is ready yet.
+        """
+        session_id = self.chunker.parse_status_query(qname)
+
+        if session_id is None:
+            logger.error("Invalid status query: %s", qname)
             return reply
 
-        with self.lock:
-            if session_id in self.response_cache and chunk_index in self.response_cache[session_id]:
-                chunk_data = self.response_cache[session_id][chunk_index]
-                txt_record = TXT(chunk_data)
-                reply.add_answer(RR(request.q.qname, QTYPE.TXT, rdata=txt_record, ttl=60))
-                logger.info(f"Served chunk {chunk_index} for session {session_id}")
-            else:
-                logger.warning(f"Chunk not found: session={session_id}, chunk={chunk_index}")
-                txt_record = TXT("NOT_FOUND")
-                reply.add_answer(RR(request.q.qname, QTYPE.TXT, rdata=txt_record, ttl=60))
+        ready_mask = 0
+        for chunk_index in self.response_cache.get(session_id, {}):
+            ready_mask |= 1 << chunk_index
+        total = ready_mask.bit_length()
 
+        reply.add_answer(RR(request.q.qname, QTYPE.TXT, rdata=TXT(f"{total}:{ready_mask:x}"), ttl=0))
         return reply
 
-    def _handle_version_request(self, request, reply):
+    def _handle_version_request(self, request, reply, qname=None, handler=None):
         """Handle version information requests."""
-        import json
-        version_info = {
-            "version": self.version,
-            "model": self.model_name
-        }
-        version_response = json.dumps(version_info)
-        txt_record = TXT(version_response)
-        reply.add_answer(RR(request.q.qname, QTYPE.TXT, rdata=txt_record, ttl=60))
-        logger.info(f"Served version info: {self.version}, model: {self.model_name}")
+        reply.add_answer(RR(request.q.qname, QTYPE.TXT, rdata=self._version_txt, ttl=60))
+        logger.info("Served version info: %s, model: %s", self.version, self.model_name)
         return reply
 
-    def _handle_test_request(self, request, reply):
+    def _handle_test_request(self, request, reply, qname=None, handler=None):
         """Handle connection test requests."""
-        txt_record = TXT("OK")
+        txt_record = _OK_TXT
         reply.add_answer(RR(request.q.qname, QTYPE.TXT, rdata=txt_record, ttl=60))
         logger.info("Served connection test request")
         return reply
@@ -284,95 +440,130 @@ Current model: """ + self.model_name + "[EOS]"
     def _process_streaming_response(self, decrypted_message: str, session_id: str,
                                   conversation_history: list, client_ip: str):
         """Process message and handle streaming response by creating incremental chunks."""
-        import threading
-        import time
+        # Reset the session's cache before returning so a client polling right
+        # away cannot pick up chunks of its previous response
+        self._store_response(session_id, {})
 
         def stream_handler():
+            # Words are published by this thread or, after a burst, by a delayed
+            # flush; publish_lock guards the segment list and what was published
+            publish_lock = threading.Lock()
+            streaming_segments = []  # Collect words for individual encryption
+            partial_chunks = {}
+            published_count = 0  # Segments covered by the last published chunks
+            last_published = 0.0
+            flush_scheduled = False
+            finished = False
+
+            # Bound once, outside the per-token loop
+            create_streaming_chunks = self.chunker.create_streaming_chunks
+            store_response = self._store_response
+            publish_interval = self.STREAM_PUBLISH_INTERVAL
+            word_endings = (' ', '\n', '.', ',', '!', '?', ':', ';')
+
+            def publish_pending():
+                """Publish words not yet sent to clients, unless the stream has ended."""
+                nonlocal partial_chunks, published_count, last_published, flush_scheduled
+                with publish_lock:
+                    flush_scheduled = False
+                    if finished or published_count == len(streaming_segments):
+                        return
+                    try:
+                        partial_chunks = create_streaming_chunks(
+                            self.crypto, streaming_segments, session_id, partial_chunks)
+
+                        # Update cache with current state
+                        store_response(session_id, partial_chunks)
+                    except Exception as e:
+                        logger.error("Error creating streaming chunks: %s", e)
+                        # Fall back to traditional chunking
+                        encrypted_partial = self.crypto.encrypt(''.join(streaming_segments))
+                        fallback_chunks = self.chunker.create_response_chunks(encrypted_partial, session_id)
+                        store_response(session_id, fallback_chunks)
+                    published_count = len(streaming_segments)
+                    last_published = time.monotonic()
+
             try:
                 complete_response = ""
-                chunk_count = 0
-
-                # Initialize streaming response cache
-                with self.lock:
-                    if session_id not in self.response_cache:
-                        self.response_cache[session_id] = {}
-
-                # Process streaming tokens with immediate word-level encryption
-                streaming_segments = []  # Collect words for individual encryption
                 current_word = ""
-                word_count = 0
 
+                # Stable per client, so every turn of a conversation shares the
+                # provider's prompt cache; hashed to keep the address private
+                cache_key = hashlib.blake2b(client_ip.encode(), digest_size=16).hexdigest()
                 for token_data in self.llm.process_message_stream(decrypted_message,
-                                                                conversation_history=conversation_history):
+                                                                conversation_history=conversation_history,
+                                                                cache_key=cache_key):
                     if token_data['type'] == 'token':
                         token_content = token_data['content']
                         complete_response += token_content
                         current_word += token_content
 
                         # Check if we have a complete word (ends with space or punctuation)
-                        if token_content.endswith((' ', '\n', '.', ',', '!', '?', ':', ';')):
+                        if token_content.endswith(word_endings):
                             if current_word.strip():  # Only add non-empty words
-                                streaming_segments.append(current_word)
+                                # Publish words as they complete, but coalesce words that
+                                # arrive within STREAM_PUBLISH_INTERVAL of the last update so
+                                # fast models do not re-encrypt the tail chunk per token.
+                                # Coalesced words get a delayed flush, so a pause after a
+                                # burst (slow tokens, tool calls) cannot hold them back
+                                with publish_lock:
+                                    streaming_segments.append(current_word)
+                                    wait = last_published + publish_interval - time.monotonic()
+                                    if wait > 0 and not flush_scheduled:
+                                        flush_scheduled = True
+                                        self.stream_flushes.call_later(wait, publish_pending)
                                 current_word = ""
-                                word_count += 1
-
-                                # Send chunks immediately for real-time word-by-word streaming
-                                # Create and send chunk for EVERY word for maximum responsiveness
-                                if True:  # Send every single word immediately
-                                    try:
-                                        partial_chunks = self.chunker.create_streaming_chunks(
-                                            self.crypto, streaming_segments, session_id)
-
-                                        # Update cache with current state
-                                        with self.lock:
-                                            self.response_cache[session_id] = partial_chunks
-
-                                        chunk_count += 1
-                                    except Exception as e:
-                                        logger.error(f"Error creating streaming chunks: {e}")
-                                        # Fall back to traditional chunking
-                                        encrypted_partial = self.crypto.encrypt(complete_response)
-                                        partial_chunks = self.chunker.create_response_chunks(encrypted_partial, session_id)
-                                        with self.lock:
-                                            self.response_cache[session_id] = partial_chunks
-
-                        # Very small delay to prevent overwhelming but maintain responsiveness
-                        time.sleep(0.005)
+                                if wait <= 0:
+                                    publish_pending()
 
                     elif token_data['type'] == 'complete':
-                        # Handle any remaining partial word
-                        if current_word.strip():
-                            streaming_segments.append(current_word)
-
                         # Final complete response
                         complete_response = token_data['content']
-                        logger.info(f"LLM response: {complete_response}")
-
-                        # Create final streaming chunks if we have segments
-                        if streaming_segments:
-                            try:
-                                final_chunks = self.chunker.create_streaming_chunks(
-                                    self.crypto, streaming_segments, session_id)
-                                with self.lock:
-                                    self.response_cache[session_id] = final_chunks
-                            except Exception as e:
-                                logger.error(f"Error creating final streaming chunks: {e}")
-                                # Fall back to traditional method
-                                encrypted_response = self.crypto.encrypt(complete_response)
-                                response_chunks = self.chunker.create_response_chunks(encrypted_response, session_id)
-                                with self.lock:
-                                    self.response_cache[session_id] = response_chunks
-                        else:
-                            # No streaming segments, use traditional method
-                            encrypted_response = self.crypto.encrypt(complete_response)
-                            response_chunks = self.chunker.create_response_chunks(encrypted_response, session_id)
-                            with self.lock:
-                                self.response_cache[session_id] = response_chunks
+                        logger.info("LLM response: %s", complete_response)
+
+                        with publish_lock:
+                            # No partial publish may land after the final chunks
+                            finished = True
+
+                            # Handle any remaining partial word
+                            if current_word.strip():
+                                streaming_segments.append(current_word)
+
+                            # A stream cut short ends with text that never came as tokens
+                            # (e.g. "Error processing message: ..."); send it after what
+                            # the client already has rather than drop it
+                            streamed = ''.join(streaming_segments)
+                            if streaming_segments and complete_response.rstrip() != streamed.rstrip():
+                                if complete_response.startswith(streamed):
+                                    missing = complete_response[len(streamed):]
+                                else:
+                                    missing = '\n' + complete_response
+                                streaming_segments.extend(_WORD_RE.findall(missing))
+
+                            # Close the stream with the EOS marker as its own segment, so
+                            # chunks the client already has keep their tokens
+                            if streaming_segments:
+                                streaming_segments.append("[EOS]")
+                                try:
+                                    final_chunks = self.chunker.create_streaming_chunks(
+                                        self.crypto, streaming_segments, session_id, partial_chunks)
+                                except Exception as e:
+                                    logger.error("Error creating final streaming chunks: %s", e)
+                                    # Fall back to traditional method
+                                    encrypted_response = self.crypto.encrypt(complete_response + "[EOS]")
+                                    final_chunks = self.chunker.create_response_chunks(encrypted_response, session_id)
+                            else:
+                                # No streaming segments, use traditional method
+                                encrypted_response = self.crypto.encrypt(complete_response + "[EOS]")
+                                final_chunks = self.chunker.create_response_chunks(encrypted_response, session_id)
+
+                            self._store_response(session_id, final_chunks)
 
                         # Update conversation history
                         with self.lock:
                             if client_ip not in self.conversations:
                                 self.conversations[client_ip] = []
+                            self.conversations.move_to_end(client_ip)
 
                             # Add user message and assistant response to history
                             self.conversations[client_ip].extend([
@@ -380,37 +571,33 @@ Current model: """ + self.model_name + "[EOS]"
                                 {"role": "assistant", "content": complete_response}
                             ])
 
-                            # Keep only last 20 messages (10 exchanges) to prevent context overflow
-                            if len(self.conversations[client_ip]) > 20:
-                                self.conversations[client_ip] = self.conversations[client_ip][-20:]
+                            # Cap the history to prevent context overflow. Trimming in one
+                            # step rather than sliding by one exchange per turn keeps the
+                            # prompt prefix identical across turns, so provider-side prompt
+                            # caching can reuse it until the next trim
+                            if len(self.conversations[client_ip]) > self.max_history_messages:
+                                self.conversations[client_ip] = self.conversations[client_ip][-self.history_trim_to:]
 
-                        # Add EOS marker to final response
-                        complete_response_with_eos = complete_response + "[EOS]"
-
-                        # Final encrypted response
-                        encrypted_response = self.crypto.encrypt(complete_response_with_eos)
-                        response_chunks = self.chunker.create_response_chunks(encrypted_response, session_id)
-
-                        with self.lock:
-                            self.response_cache[session_id] = response_chunks
+                            # Forget the least recently active clients beyond the cap
+                            while len(self.conversations) > self.MAX_CONVERSATIONS:
+                                self.conversations.popitem(last=False)
 
-                        logger.info(f"Streaming complete. Final response has {len(response_chunks)} chunks for session {session_id}")
+                        logger.info("Streaming complete. Final response has %s chunks for session %s", len(final_chunks), session_id)
                         break
 
             except Exception as e:
-                logger.error(f"Error in streaming handler: {e}")
+                logger.error("Error in streaming handler: %s", e)
                 # Create error response
                 error_response = f"Error: {str(e)}[EOS]"
                 encrypted_error = self.crypto.encrypt(error_response)
                 error_chunks = self.chunker.create_response_chunks(encrypted_error, session_id)
 
-                with self.lock:
-                    self.response_cache[session_id] = error_chunks
+                with publish_lock:
+                    finished = True
+                    self._store_response(session_id, error_chunks)
 
-        # Start streaming in a separate thread
-        stream_thread = threading.Thread(target=stream_handler)
-        stream_thread.daemon = True
-        stream_thread.start()
+        # Stream on a worker thread so the DNS reply is not held up
+        self.stream_executor.submit(stream_handler)
 
 
 class LLMDNSServer:
@@ -425,15 +612,17 @@ class LLMDNSServer:
         """Start the DNS server."""
         version = self.resolver.version
         model = self.resolver.model_name
-        logger.info(f"Starting LLM DNS server on {self.host}:{self.port} ({version}, model: {model})")
+        logger.info("Starting LLM DNS server on %s:%s (%s, model: %s)", self.host, self.port, version, model)
         self.server = DNSServer(self.resolver, port=self.port, address=self.host)
         self.server.start_thread()
-        logger.info(f"Server started successfully ({version}, model: {model})")
+        logger.info("Server started successfully (%s, model: %s)", version, model)
 
     def stop(self):
         """Stop the DNS server."""
         if self.server:
             self.server.stop()
+            # Drop queued streams; ones already talking to the LLM finish on their own
+            self.resolver.stream_executor.shutdown(wait=False, cancel_futures=True)
             logger.info("Server stopped")
 
     def run(self):
@@ -4,11 +4,13 @@ Version utilities for the LLM DNS Proxy.
 
 import subprocess
 import os
+from functools import lru_cache
 from typing import Optional
 
 
+@lru_cache(maxsize=None)
 def get_git_sha() -> Optional[str]:
-    """Get the short git SHA hash of the current repository."""
+    """Get the short git SHA hash of the current repository (runs git once per process)."""
     try:
         # Get the directory of this file to find the git repo root
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -31,8 +33,9 @@ def get_git_sha() -> Optional[str]:
         return None
 
 
+@lru_cache(maxsize=None)
 def get_version_string() -> str:
-    """Get a version string with git SHA if available."""
+    """Get a version string with git SHA if available (computed once per process)."""
     sha = get_git_sha()
     if sha:
         return f"git-{sha}"
@@ -4,6 +4,7 @@ Tests for DNS message chunking utilities.
 
 import pytest
 import base64
+from unittest.mock import patch
 from llm_dns_proxy.chunking import DNSChunker
 from llm_dns_proxy.config import get_dns_suffix, format_dns_query
 from .test_utils import dns_suffix_override, get_test_dns_suffix
@@ -36,6 +37,15 @@ class TestDNSChunker:
             assert parts[3] == str(len(chunks))
             assert parts[-len(suffix_parts):] == suffix_parts
 
+    def test_create_chunks_respects_dns_limits(self):
+        chunker = DNSChunker()
+        data = b"C" * 4000
+
+        chunks = chunker.create_chunks(data, "limits")
+        for chunk in chunks:
+            assert len(chunk) <= DNSChunker.MAX_DNS_QNAME_LENGTH
+            assert all(len(label) <= DNSChunker.MAX_DNS_LABEL_LENGTH for label in chunk.split('.'))
+
     def test_process_chunk_query_single_chunk(self):
         chunker = DNSChunker()
         data = b"test message"
@@ -75,6 +85,106 @@ class TestDNSChunker:
 
             assert complete_data == data
 
+    def test_process_chunk_query_duplicate_chunk(self):
+        chunker = DNSChunker()
+        data = b"D" * 500
+
+        chunks = chunker.create_chunks(data, "session5")
+        assert len(chunks) > 1
+
+        # A retried chunk must not count towards completion twice
+        for _ in range(len(chunks)):
+            session_id, complete_data = chunker.process_chunk_query(chunks[0])
+            assert session_id == "session5"
+            assert complete_data is None
+
+        for chunk in chunks[1:]:
+            session_id, complete_data = chunker.process_chunk_query(chunk)
+
+        assert complete_data == data
+
+    def test_process_chunk_query_retry_after_completion(self):
+        chunker = DNSChunker()
+
+        single = chunker.create_chunks(b"short", "session6")
+        assert chunker.process_chunk_query(single[0]) == ("session6", b"short")
+        # A late retry of a completed message must not be delivered again
+        assert chunker.process_chunk_query(single[0]) == ("session6", None)
+
+        chunks = chunker.create_chunks(b"E" * 500, "session6")
+        for chunk in chunks:
+            session_id, complete_data = chunker.process_chunk_query(chunk)
+        assert complete_data == b"E" * 500
+
+        # ...nor leave a half-filled message behind that the next one would join
+        assert chunker.process_chunk_query(chunks[-1]) == ("session6", None)
+        assert "session6" not in chunker.pending_messages
+
+        next_chunks = chunker.create_chunks(b"F" * 500, "session6")
+        for chunk in next_chunks:
+            session_id, complete_data = chunker.process_chunk_query(chunk)
+        assert complete_data == b"F" * 500
+
+    def test_completed_messages_are_bounded(self):
+        chunker = DNSChunker()
+        chunker.MAX_COMPLETED_MESSAGES = 2
+
+        for session_id in ("s1", "s2", "s3"):
+            chunker.process_chunk_query(chunker.create_chunks(b"done", session_id)[0])
+
+        # Only the most recently completed sessions are kept
+        assert list(chunker.completed_messages) == ["s2", "s3"]
+        assert set(chunker.completed_at) == {"s2", "s3"}
+
+    def test_completed_messages_expire(self):
+        chunker = DNSChunker()
+
+        with patch('llm_dns_proxy.chunking.time.monotonic', return_value=1000.0):
+            chunker.process_chunk_query(chunker.create_chunks(b"old", "s1")[0])
+        later = 1000.0 + chunker.COMPLETED_MESSAGE_TTL + 1
+        with patch('llm_dns_proxy.chunking.time.monotonic', return_value=later):
+            chunker.process_chunk_query(chunker.create_chunks(b"new", "s2")[0])
+
+        assert list(chunker.completed_messages) == ["s2"]
+
+    def test_process_chunk_query_index_out_of_range(self):
+        chunker = DNSChunker()
+
+        # An index past the total is rejected before any slots are allocated
+        assert chunker.process_chunk_query(format_dns_query("m", "session7", 2, 2, "00")) == (None, None)
+        assert chunker.process_chunk_query(format_dns_query("m", "session7", 0, 0, "00")) == (None, None)
+        assert "session7" not in chunker.pending_messages
+
+        # ...and against the slots of a message already in progress
+        assert chunker.process_chunk_query(format_dns_query("m", "session7", 0, 2, "00")) == ("session7", None)
+        assert chunker.process_chunk_query(format_dns_query("m", "session7", 5, 9, "00")) == (None, None)
+        assert chunker.received_counts["session7"] == 1
+
+    def test_process_chunk_query_rejects_huge_total(self):
+        chunker = DNSChunker()
+
+        # The total comes straight off the wire, so it must not size an allocation
+        for total in (DNSChunker.MAX_MESSAGE_CHUNKS + 1, 50000000, 10 ** 30):
+            assert chunker.process_chunk_query(format_dns_query("m", "abc", 0, total, "00")) == (None, None)
+        assert "abc" not in chunker.pending_messages
+
+        limit = DNSChunker.MAX_MESSAGE_CHUNKS
+        assert chunker.process_chunk_query(format_dns_query("m", "abc", 0, limit, "00")) == ("abc", None)
+
+    def test_process_chunk_query_case_folded_data(self):
+        """Data labels must survive resolvers that change the case of the qname."""
+        chunker = DNSChunker()
+        data = b"case folding test"
+
+        chunks = chunker.create_chunks(data, "session4")
+        suffix_len = len(get_dns_suffix().split('.'))
+        parts = chunks[0].split('.')
+        parts[4:-suffix_len] = [label.upper() for label in parts[4:-suffix_len]]
+
+        session_id, complete_data = chunker.process_chunk_query('.'.join(parts))
+        assert session_id == "session4"
+        assert complete_data == data
+
     def test_invalid_chunk_query(self):
         chunker = DNSChunker()
 
@@ -131,6 +241,16 @@ class TestDNSChunker:
             assert session_id is None
             assert chunk_index is None
 
+    def test_parse_status_query(self):
+        chunker = DNSChunker()
+        suffix = get_dns_suffix()
+
+        assert chunker.parse_status_query(format_dns_query("s", "session123")) == "session123"
+        assert chunker.parse_status_query(f"s.session123.{suffix}.") == "session123"
+        assert chunker.parse_status_query(f"s.session.0.{suffix}") is None
+        assert chunker.parse_status_query(f"g.session123.{suffix}") is None
+        assert chunker.parse_status_query("s.session123.wrong.domain") is None
+
     def test_reassemble_response(self):
         chunker = DNSChunker()
         original_data = b"test response data"
@@ -145,6 +265,20 @@ class TestDNSChunker:
         reassembled = chunker.reassemble_response({})
         assert reassembled == b''
 
+    def test_streaming_chunks_reuse_closed_tokens(self):
+        from llm_dns_proxy.crypto import CryptoManager
+        chunker = DNSChunker()
+        crypto = CryptoManager()
+        segments = [f"word{i} " for i in range(60)]
+
+        first = chunker.create_streaming_chunks(crypto, segments[:40], "stream")
+        second = chunker.create_streaming_chunks(crypto, segments, "stream", first)
+
+        assert len(first) > 1
+        for idx in range(len(first) - 1):
+            assert second[idx].split(':', 2)[2] == first[idx].split(':', 2)[2]
+        assert chunker.reassemble_streaming_chunks(crypto, second) == ''.join(segments)
+
     def test_session_isolation(self):
         chunker = DNSChunker()
 
@@ -0,0 +1,184 @@
+"""
+Tests for the DNS client.
+"""
+
+import socket
+import threading
+
+import pytest
+from unittest.mock import patch
+from dnslib import DNSRecord, DNSHeader, DNSQuestion, RR, QTYPE, A, CNAME, TXT
+from llm_dns_proxy.client import DNSLLMClient, _pack_txt_query
+from llm_dns_proxy.config import format_dns_query
+from llm_dns_proxy.crypto import CryptoManager
+
+
+def _txt_reply(request, *answers):
+    """Build the packed reply to request with the given answer records."""
+    reply = request.reply()
+    for answer in answers:
+        reply.add_answer(answer)
+    return reply.pack()
+
+
+class TestDNSLLMClient:
+    @pytest.fixture
+    def client(self):
+        client = DNSLLMClient(crypto_key=CryptoManager.generate_key())
+        yield client
+        client.sock.close()
+
+    @pytest.fixture
+    def fake_server(self, client):
+        """Connect client to one end of a datagram socketpair and serve the other with a script.
+
+        The script gets the server socket and returns when it is done; replies
+        are built with dnslib, so they exercise the client's own wire codec.
+        """
+        client.sock.close()
+        client.sock, server_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        client._send_packet = client.sock.send
+        threads = []
+
+        def serve(script):
+            thread = threading.Thread(target=script, args=(server_sock,), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        yield serve
+        for thread in threads:
+            thread.join(timeout=5)
+        server_sock.close()
+
+    def test_pack_txt_query_round_trip(self):
+        buf = bytearray(512)
+        for name in (format_dns_query("g", "123", 4), "m.123.0.1.abc.example.com", "t.example.com."):
+            length = _pack_txt_query(buf, 4242, name)
+            request = DNSRecord.parse(bytes(buf[:length]))
+
+            assert request.header.id == 4242
+            assert request.header.rd == 1
+            assert str(request.q.qname) == name.rstrip('.') + '.'
+            assert request.q.qtype == QTYPE.TXT
+
+    def test_pack_txt_query_rejects_invalid_names(self):
+        buf = bytearray(512)
+        for name in ("a" * 64 + ".example.com", "a..example.com", ".".join(["abcdefgh"] * 30)):
+            with pytest.raises(ValueError):
+                _pack_txt_query(buf, 1, name)
+
+    def test_parse_txt_response(self):
+        request = DNSRecord.question(format_dns_query("g", "123", 0), "TXT")
+        # dnslib compresses the answer name into a pointer to the question
+        packet = _txt_reply(request, RR(request.q.qname, QTYPE.TXT, rdata=TXT("0:1:data")))
+        assert b"\xc0\x0c" in packet
+
+        assert DNSLLMClient._parse_txt_response(packet) == (request.header.id, "0:1:data")
+        assert DNSLLMClient._parse_txt_response(memoryview(packet)) == (request.header.id, "0:1:data")
+
+    def test_parse_txt_response_multiple_strings(self):
+        request = DNSRecord.question("t.example.com", "TXT")
+        packet = _txt_reply(request, RR(request.q.qname, QTYPE.TXT, rdata=TXT([b"first ", b"second"])))
+
+        assert DNSLLMClient._parse_txt_response(packet) == (request.header.id, "first second")
+
+    def test_parse_txt_response_skips_other_records(self):
+        request = DNSRecord.question("t.example.com", "TXT")
+        packet = _txt_reply(
+            request,
+            RR(request.q.qname, QTYPE.CNAME, rdata=CNAME("alias.example.com")),
+            RR(request.q.qname, QTYPE.A, rdata=A("127.0.0.1")),
+            RR("alias.example.com", QTYPE.TXT, rdata=TXT("OK")),
+        )
+
+        assert DNSLLMClient._parse_txt_response(packet) == (request.header.id, "OK")
+
+    def test_parse_txt_response_without_txt(self):
+        request = DNSRecord.question("t.example.com", "TXT")
+        assert DNSLLMClient._parse_txt_response(_txt_reply(request)) == (request.header.id, None)
+
+        packet = _txt_reply(request, RR(request.q.qname, QTYPE.A, rdata=A("127.0.0.1")))
+        assert DNSLLMClient._parse_txt_response(packet) == (request.header.id, None)
+
+    def test_parse_txt_response_truncated(self):
+        request = DNSRecord.question(format_dns_query("g", "123", 0), "TXT")
+        packet = _txt_reply(request, RR(request.q.qname, QTYPE.TXT, rdata=TXT("0:1:data")))
+
+        # No prefix of a reply may parse as a (shorter) answer
+        for cut in range(len(packet)):
+            with pytest.raises(Exception):
+                DNSLLMClient._parse_txt_response(packet[:cut])
+
+    def test_send_dns_queries_matches_replies_by_qid(self, client, fake_server):
+        names = [format_dns_query("g", "123", i) for i in range(5)]
+
+        def reply_in_reverse(server_sock):
+            requests = [DNSRecord.parse(server_sock.recv(512)) for _ in names]
+            for request in reversed(requests):
+                answer = str(request.q.qname).split('.')[2]
+                server_sock.send(_txt_reply(request, RR(request.q.qname, QTYPE.TXT, rdata=TXT(answer))))
+
+        fake_server(reply_in_reverse)
+        assert client._send_dns_queries(names, timeout=2.0) == ["0", "1", "2", "3", "4"]
+
+    def test_send_dns_queries_retries_lost_reply(self, client, fake_server):
+        received = []
+
+        def drop_first(server_sock):
+            for _ in range(2):
+                request = DNSRecord.parse(server_sock.recv(512))
+                received.append(request.header.id)
+                if len(received) == 2:
+                    server_sock.send(_txt_reply(request, RR(request.q.qname, QTYPE.TXT, rdata=TXT("OK"))))
+
+        fake_server(drop_first)
+        assert client._send_dns_queries(["t.example.com"], timeout=0.1, max_retries=2) == ["OK"]
+        # The retransmission reuses the transaction ID
+        assert received[0] == received[1]
+
+    def test_send_dns_queries_ignores_stale_replies(self, client, fake_server):
+        def stale_then_real(server_sock):
+            request = DNSRecord.parse(server_sock.recv(512))
+            stale = DNSRecord(DNSHeader(id=(request.header.id + 1) & 0xFFFF, qr=1),
+                              q=DNSQuestion("t.example.com", QTYPE.TXT))
+            # A late reply to an earlier query, then garbage, then the answer
+            server_sock.send(_txt_reply(stale, RR("t.example.com", QTYPE.TXT, rdata=TXT("stale"))))
+            server_sock.send(b"\x00garbage")
+            server_sock.send(_txt_reply(request, RR(request.q.qname, QTYPE.TXT, rdata=TXT("fresh"))))
+
+        fake_server(stale_then_real)
+        assert client._send_dns_queries(["t.example.com"], timeout=2.0, max_retries=0) == ["fresh"]
+
+    def test_send_dns_queries_gives_up_after_retries(self, client, fake_server):
+        def never_answer(server_sock):
+            server_sock.settimeout(0.5)
+            try:
+                while True:
+                    server_sock.recv(512)
+            except socket.timeout:
+                pass
+
+        fake_server(never_answer)
+        with patch.object(client, '_send_packet', wraps=client._send_packet) as send:
+            assert client._send_dns_queries(["t.example.com"], timeout=0.05, max_retries=2) == [None]
+        assert send.call_count == 3
+
+    def test_get_ready_chunks_rejects_out_of_range_totals(self, client):
+        cases = {
+            "3:ff": 0b111,
+            "0:0": 0,
+            "-1:0": None,
+            "1000:1": None,
+            "5": None,
+            "x:1": None,
+        }
+        for answer, expected in cases.items():
+            with patch.object(client, '_send_dns_query', return_value=answer):
+                assert client._get_ready_chunks("123") == expected, answer
+
+    def test_parse_chunk_header_rejects_out_of_range(self, client):
+        assert client._parse_chunk_header("0:3:data") == (0, 3)
+        assert client._parse_chunk_header("998:999:data") == (998, 999)
+
+        for response in ("3:3:data", "-1:3:data", "0:0:data", "0:-2:data", "0:1000:data", "0:3", None):
+            assert client._parse_chunk_header(response) is None, response
@@ -0,0 +1,24 @@
+"""
+Tests for configuration utilities.
+"""
+
+import os
+from unittest.mock import patch
+from llm_dns_proxy.config import get_history_window
+
+
+class TestConfig:
+    def test_configurable_history_window(self):
+        """Test that the history window falls back to a sane value when misconfigured."""
+        with patch.dict(os.environ, {"LLM_HISTORY_WINDOW": "4"}):
+            assert get_history_window() == 4
+
+        # Unparseable values fall back to the default
+        with patch.dict(os.environ, {"LLM_HISTORY_WINDOW": "many"}):
+            assert get_history_window() == 10
+
+        # At least one turn is always kept
+        with patch.dict(os.environ, {"LLM_HISTORY_WINDOW": "0"}):
+            assert get_history_window() == 1
+        with patch.dict(os.environ, {"LLM_HISTORY_WINDOW": "-3"}):
+            assert get_history_window() == 1
@@ -2,6 +2,8 @@
 Tests for encryption utilities.
 """
 
+import zlib
+
 import pytest
 from cryptography.fernet import Fernet
 from llm_dns_proxy.crypto import CryptoManager
@@ -24,6 +26,31 @@ class TestCryptoManager:
         decrypted = crypto.decrypt(encrypted)
         assert decrypted == message
 
+    def test_encrypted_chunk_length_matches_encrypt_chunk(self):
+        crypto = CryptoManager()
+        for length in range(0, 200):
+            text = "é" * (length // 2) + "a" * (length % 2)
+            expected = len(crypto.encrypt_chunk(text))
+            assert crypto.encrypted_chunk_length(len(text.encode('utf-8'))) == expected
+
+    def test_decrypt_accepts_tokens_compressed_without_dictionary(self):
+        crypto = CryptoManager()
+        message = "Compressed by a peer that does not use the preset dictionary"
+
+        token = crypto.fernet.encrypt(zlib.compress(message.encode(), level=9))
+        assert crypto.decrypt(token) == message
+
+    def test_decrypt_rejects_truncated_compressed_stream(self):
+        crypto = CryptoManager()
+        compressed = zlib.compress(("A truncated stream must not decode silently. " * 20).encode())
+
+        with pytest.raises(ValueError):
+            crypto.decrypt(crypto.fernet.encrypt(compressed[:len(compressed) // 2]))
+
+        # Data after the end of the stream is rejected too
+        with pytest.raises(ValueError):
+            crypto.decrypt(crypto.fernet.encrypt(compressed + b"extra"))
+
     def test_with_custom_key(self):
         key = Fernet.generate_key()
         crypto = CryptoManager(key)
@@ -183,10 +210,7 @@ class TestCryptoManager:
         encryptions = [crypto.encrypt(message) for _ in range(10)]
 
         # All encryptions should be different (Fernet uses random IV)
-        for i, enc1 in enumerate(encryptions):
-            for j, enc2 in enumerate(encryptions):
-                if i != j:
-                    assert enc1 != enc2, "Encryption should be non-deterministic"
+        assert len(set(encryptions)) == len(encryptions), "Encryption should be non-deterministic"
 
     def test_key_generation_uniqueness(self):
         """Test that key generation produces unique keys."""
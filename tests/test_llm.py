@@ -2,12 +2,30 @@
 Tests for LLM integration.
 """
 
+import json
+import threading
+
 import pytest
 from unittest.mock import Mock, patch
 from llm_dns_proxy.llm import LLMProcessor
 
 
 class TestLLMProcessor:
+    @staticmethod
+    def _chat_response(content):
+        """Build a non-streaming completion with one plain text message."""
+        message = Mock(content=content, tool_calls=None)
+        return Mock(choices=[Mock(message=message)])
+
+    @staticmethod
+    def _stream_of(text):
+        """Build a streaming completion that yields text as a single delta."""
+        chunk = Mock()
+        chunk.choices = [Mock()]
+        chunk.choices[0].delta.content = text
+        chunk.choices[0].delta.tool_calls = None
+        return iter([chunk])
+
     def test_init_with_api_key(self):
         processor = LLMProcessor(api_key="test-key")
         assert processor.api_key == "test-key"
@@ -59,16 +77,7 @@ class TestLLMProcessor:
 
     @patch('llm_dns_proxy.llm.OpenAI')
     def test_process_message_sync_success(self, mock_openai):
-        mock_message = Mock()
-        mock_message.content = "Test response"
-        mock_message.tool_calls = None  # No tool calls
-
-        mock_choice = Mock()
-        mock_choice.message = mock_message
-
-        mock_response = Mock()
-        mock_response.choices = [mock_choice]
-        mock_openai.return_value.chat.completions.create.return_value = mock_response
+        mock_openai.return_value.chat.completions.create.return_value = self._chat_response("Test response")
 
         processor = LLMProcessor(api_key="test-key")
         result = processor.process_message_sync("Test message")
@@ -78,16 +87,7 @@ class TestLLMProcessor:
 
     @patch('llm_dns_proxy.llm.OpenAI')
     def test_process_message_sync_with_system_prompt(self, mock_openai):
-        mock_message = Mock()
-        mock_message.content = "Test response"
-        mock_message.tool_calls = None  # No tool calls
-
-        mock_choice = Mock()
-        mock_choice.message = mock_message
-
-        mock_response = Mock()
-        mock_response.choices = [mock_choice]
-        mock_openai.return_value.chat.completions.create.return_value = mock_response
+        mock_openai.return_value.chat.completions.create.return_value = self._chat_response("Test response")
 
         processor = LLMProcessor(api_key="test-key")
         result = processor.process_message_sync("Test message", "System prompt")
@@ -115,16 +115,7 @@ class TestLLMProcessor:
     @patch.dict('os.environ', {'OPENAI_MODEL': 'gpt-4'})
     @patch('llm_dns_proxy.llm.OpenAI')
     def test_custom_model_from_env(self, mock_openai):
-        mock_message = Mock()
-        mock_message.content = "Response"
-        mock_message.tool_calls = None  # No tool calls
-
-        mock_choice = Mock()
-        mock_choice.message = mock_message
-
-        mock_response = Mock()
-        mock_response.choices = [mock_choice]
-        mock_openai.return_value.chat.completions.create.return_value = mock_response
+        mock_openai.return_value.chat.completions.create.return_value = self._chat_response("Response")
 
         processor = LLMProcessor(api_key="test-key")
         processor.process_message_sync("Test")
@@ -134,16 +125,7 @@ class TestLLMProcessor:
 
     @patch('llm_dns_proxy.llm.OpenAI')
     def test_process_message_sync_with_conversation_history(self, mock_openai):
-        mock_message = Mock()
-        mock_message.content = "Based on our previous conversation, I can help!"
-        mock_message.tool_calls = None  # No tool calls
-
-        mock_choice = Mock()
-        mock_choice.message = mock_message
-
-        mock_response = Mock()
-        mock_response.choices = [mock_choice]
-        mock_openai.return_value.chat.completions.create.return_value = mock_response
+        mock_openai.return_value.chat.completions.create.return_value = self._chat_response("Based on our previous conversation, I can help!")
 
         processor = LLMProcessor(api_key="test-key")
 
@@ -163,4 +145,62 @@ class TestLLMProcessor:
         assert len(messages) == 3  # history (2) + current message (1)
         assert messages[0]['content'] == "Hello, my name is Alice"
         assert messages[1]['content'] == "Nice to meet you, Alice!"
-        assert messages[2]['content'] == "What's my name?"
\ No newline at end of file
+        assert messages[2]['content'] == "What's my name?"
+
+    @patch('llm_dns_proxy.llm.OpenAI')
+    def test_process_message_sync_runs_tool_calls_concurrently(self, mock_openai):
+        def make_tool_call(call_id, query):
+            tool_call = Mock()
+            tool_call.id = call_id
+            tool_call.type = "function"
+            tool_call.function.name = "web_search"
+            tool_call.function.arguments = json.dumps({"query": query})
+            return tool_call
+
+        tool_message = Mock()
+        tool_message.content = ""
+        tool_message.tool_calls = [make_tool_call("call_1", "first"), make_tool_call("call_2", "second")]
+        final_message = Mock()
+        final_message.content = "Done"
+        final_message.tool_calls = None
+        mock_openai.return_value.chat.completions.create.side_effect = [
+            Mock(choices=[Mock(message=tool_message)]),
+            Mock(choices=[Mock(message=final_message)]),
+        ]
+
+        processor = LLMProcessor(api_key="test-key")
+        barrier = threading.Barrier(2, timeout=5)
+
+        def execute_tool(name, raw_args):
+            # Both calls must be running at once to get past the barrier
+            barrier.wait()
+            return json.loads(raw_args)["query"]
+
+        with patch.object(processor, "_execute_tool", side_effect=execute_tool):
+            result = processor.process_message_sync("Search twice")
+
+        assert result == "Done"
+        messages = mock_openai.return_value.chat.completions.create.call_args[1]['messages']
+        tool_results = [m for m in messages if m["role"] == "tool"]
+        assert [(m["tool_call_id"], m["content"]) for m in tool_results] == [("call_1", "first"), ("call_2", "second")]
+
+    @patch('llm_dns_proxy.llm.OpenAI')
+    def test_process_message_stream_sends_prompt_cache_key(self, mock_openai):
+        mock_openai.return_value.chat.completions.create.return_value = self._stream_of("Hi")
+
+        processor = LLMProcessor(api_key="test-key")
+        events = list(processor.process_message_stream("Hello", cache_key="abc123"))
+
+        assert events[-1] == {'type': 'complete', 'content': "Hi"}
+        call_args = mock_openai.return_value.chat.completions.create.call_args
+        assert call_args[1]['extra_body'] == {"prompt_cache_key": "abc123"}
+
+    @patch('llm_dns_proxy.llm.OpenAI')
+    def test_process_message_stream_omits_prompt_cache_key_for_custom_base_url(self, mock_openai):
+        mock_openai.return_value.chat.completions.create.return_value = self._stream_of("Hi")
+
+        processor = LLMProcessor(api_key="test-key", base_url="http://localhost:8080/v1")
+        list(processor.process_message_stream("Hello", cache_key="abc123"))
+
+        call_args = mock_openai.return_value.chat.completions.create.call_args
+        assert 'extra_body' not in call_args[1]
@@ -3,7 +3,9 @@ Tests for native encryption utilities.
 """
 
 import pytest
-from llm_dns_proxy.native_crypto import CryptoManager
+from llm_dns_proxy.native_crypto import (
+    CryptoManager, chacha20_xor, _chacha20_xor_py, hkdf_sha256, _hkdf_expand, _hkdf_extract,
+)
 
 
 class TestCryptoManager:
@@ -183,10 +185,7 @@ class TestCryptoManager:
         encryptions = [crypto.encrypt(message) for _ in range(10)]
 
         # All encryptions should be different (uses random IV)
-        for i, enc1 in enumerate(encryptions):
-            for j, enc2 in enumerate(encryptions):
-                if i != j:
-                    assert enc1 != enc2, "Encryption should be non-deterministic"
+        assert len(set(encryptions)) == len(encryptions), "Encryption should be non-deterministic"
 
     def test_key_generation_uniqueness(self):
         """Test that key generation produces unique keys."""
@@ -243,4 +242,33 @@ class TestCryptoManager:
         message = ''.join(chr(i) for i in range(256))
         encrypted = crypto.encrypt(message)
         decrypted = crypto.decrypt(encrypted)
-        assert decrypted == message
\ No newline at end of file
+        assert decrypted == message
+
+    def test_chacha20_matches_rfc7539_vector(self):
+        """Test that the OpenSSL and pure-Python keystreams both match RFC 7539 2.4.2."""
+        key = bytes(range(32))
+        nonce = bytes.fromhex("000000000000004a00000000")
+        plaintext = (b"Ladies and Gentlemen of the class of '99: If I could offer you only one "
+                     b"tip for the future, sunscreen would be it.")
+        expected = bytes.fromhex(
+            "6e2e359a2568f98041ba0728dd0d6981e97e7aec1d4360c20a27afccfd9fae0b"
+            "f91b65c5524733ab8f593dabcd62b3571639d624e65152ab8f530c359f0861d8"
+            "07ca0dbf500d6a6156a38e088a22b65e52bc514d16ccf806818ce91ab7793736"
+            "5af90bbf74a35be6b40b8eedf2785e42874d"
+        )
+
+        assert chacha20_xor(key, nonce, plaintext, counter_start=1) == expected
+        assert _chacha20_xor_py(key, nonce, plaintext, counter_start=1) == expected
+
+    def test_hkdf_matches_rfc5869_vector(self):
+        """Test that the OpenSSL and pure-Python HKDF both match RFC 5869 test case 1."""
+        ikm = b"\x0b" * 22
+        salt = bytes(range(13))
+        info = bytes(range(0xf0, 0xfa))
+        expected = bytes.fromhex(
+            "3cb25f25faacd57a90434f64d0362f2a2d2d0a90cf1a5a4c5db02d56ecc4c5bf"
+            "34007208d5b887185865"
+        )
+
+        assert hkdf_sha256(ikm, salt, info, 42) == expected
+        assert _hkdf_expand(_hkdf_extract(salt, ikm), info, 42) == expected
@@ -0,0 +1,152 @@
+"""
+Tests for the DNS resolver.
+"""
+
+import threading
+import time
+from unittest.mock import patch
+
+from dnslib import DNSRecord
+
+from llm_dns_proxy.config import format_dns_query
+from llm_dns_proxy.crypto import CryptoManager
+from llm_dns_proxy.server import LLMDNSResolver, _DelayedCalls
+
+
+class TestDelayedCalls:
+    def test_calls_run_in_due_order_on_one_thread(self):
+        calls = _DelayedCalls("test-delayed")
+        done = threading.Event()
+        ran = []
+
+        def record(name):
+            ran.append((name, threading.current_thread().name))
+            if len(ran) == 3:
+                done.set()
+
+        calls.call_later(0.06, lambda: record("last"))
+        calls.call_later(0.02, lambda: record("first"))
+        calls.call_later(0.04, lambda: record("second"))
+
+        assert done.wait(2)
+        assert [name for name, _ in ran] == ["first", "second", "last"]
+        assert {thread for _, thread in ran} == {"test-delayed"}
+
+
+class TestLLMDNSResolver:
+    @staticmethod
+    def _wait_for_text(resolver, session_id, expected, timeout=2.0):
+        """Poll the published chunks until they decrypt to expected or timeout passes."""
+        deadline = time.monotonic() + timeout
+        text = None
+        while time.monotonic() < deadline:
+            chunks = resolver.response_cache.get(session_id, {})
+            text = resolver.chunker.reassemble_streaming_chunks(resolver.crypto, chunks)
+            if text == expected:
+                break
+            time.sleep(0.01)
+        return text
+
+    @staticmethod
+    def _query(resolver, handler, qname):
+        """Call a query handler directly and return the text of its TXT answer, if any."""
+        request = DNSRecord.question(qname, "TXT")
+        reply = handler(request, request.reply(), qname)
+        return str(reply.rr[0].rdata).strip('"') if reply.rr else None
+
+    @patch('llm_dns_proxy.server.LLMProcessor')
+    def test_status_reports_ready_chunks(self, mock_llm_cls):
+        resolver = LLMDNSResolver(CryptoManager.generate_key())
+        status = resolver._handle_status_request
+
+        assert self._query(resolver, status, format_dns_query("s", "session")) == "0:0"
+        resolver._store_response("session", {0: "0:3:a", 2: "2:3:c"})
+        assert self._query(resolver, status, format_dns_query("s", "session")) == "3:5"
+        # Malformed status queries get no answer
+        assert self._query(resolver, status, format_dns_query("s", "session", 1)) is None
+
+    @patch('llm_dns_proxy.server.LLMProcessor')
+    def test_wait_returns_when_response_changes(self, mock_llm_cls):
+        resolver = LLMDNSResolver(CryptoManager.generate_key())
+        wait = resolver._handle_wait_request
+        resolver._store_response("session", {})
+
+        # Already past the client's version: answered at once
+        assert self._query(resolver, wait, format_dns_query("w", "session", 0)) == "1"
+
+        # Held until the next update
+        update = threading.Timer(0.1, resolver._store_response, args=("session", {0: "0:1:a"}))
+        update.start()
+        start = time.monotonic()
+        assert self._query(resolver, wait, format_dns_query("w", "session", 1)) == "2"
+        assert 0.05 < time.monotonic() - start < resolver.WAIT_TIMEOUT
+        update.join()
+
+        # Unchanged after WAIT_TIMEOUT
+        resolver.WAIT_TIMEOUT = 0.05
+        assert self._query(resolver, wait, format_dns_query("w", "session", 2)) == "2"
+        assert self._query(resolver, wait, format_dns_query("w", "session", "x")) is None
+
+    @patch('llm_dns_proxy.server.LLMProcessor')
+    def test_wait_answers_unknown_session_at_once(self, mock_llm_cls):
+        resolver = LLMDNSResolver(CryptoManager.generate_key())
+
+        start = time.monotonic()
+        assert self._query(resolver, resolver._handle_wait_request, format_dns_query("w", "nobody", 0)) == "0"
+        assert self._query(resolver, resolver._handle_wait_request, format_dns_query("w", "nobody", 7)) == "0"
+        assert time.monotonic() - start < 1
+
+    @patch('llm_dns_proxy.server.LLMProcessor')
+    def test_wait_answers_at_once_when_waiters_are_full(self, mock_llm_cls):
+        resolver = LLMDNSResolver(CryptoManager.generate_key())
+        resolver._store_response("session", {})
+        for _ in range(resolver.MAX_WAITERS):
+            resolver.wait_slots.acquire()
+
+        start = time.monotonic()
+        assert self._query(resolver, resolver._handle_wait_request, format_dns_query("w", "session", 1)) == "1"
+        assert time.monotonic() - start < 1
+
+    @patch('llm_dns_proxy.server.LLMProcessor')
+    def test_stream_publishes_burst_before_pause(self, mock_llm_cls):
+        release = threading.Event()
+        burst = ["Hello ", "there, ", "how ", "are ", "you? "]
+
+        def fake_stream(message, conversation_history=None, cache_key=None):
+            for token in burst:
+                yield {'type': 'token', 'content': token}
+            # Pause after the burst, as during a tool call round trip
+            release.wait(5)
+            yield {'type': 'token', 'content': "Bye."}
+            yield {'type': 'complete', 'content': ''.join(burst) + "Bye."}
+
+        mock_llm_cls.return_value.process_message_stream.side_effect = fake_stream
+        resolver = LLMDNSResolver(CryptoManager.generate_key())
+        try:
+            resolver._process_streaming_response("Hi", "session", [], "127.0.0.1")
+
+            # Every word of the burst is visible while the stream is paused
+            assert self._wait_for_text(resolver, "session", ''.join(burst)) == ''.join(burst)
+        finally:
+            release.set()
+            resolver.stream_executor.shutdown(wait=True)
+
+        expected = ''.join(burst) + "Bye.[EOS]"
+        assert self._wait_for_text(resolver, "session", expected) == expected
+
+    @patch('llm_dns_proxy.server.LLMProcessor')
+    def test_stream_error_after_tokens_reaches_client(self, mock_llm_cls):
+        def fake_stream(message, conversation_history=None, cache_key=None):
+            yield {'type': 'token', 'content': "Partial "}
+            yield {'type': 'token', 'content': "answer "}
+            # What process_message_stream yields when the provider fails mid-stream
+            yield {'type': 'complete', 'content': "Error processing message: connection reset"}
+
+        mock_llm_cls.return_value.process_message_stream.side_effect = fake_stream
+        resolver = LLMDNSResolver(CryptoManager.generate_key())
+        resolver._process_streaming_response("Hi", "session", [], "127.0.0.1")
+        resolver.stream_executor.shutdown(wait=True)
+
+        expected = "Partial answer \nError processing message: connection reset[EOS]"
+        assert self._wait_for_text(resolver, "session", expected) == expected
+        assert resolver.conversations["127.0.0.1"][-1]["content"] == "Error processing message: connection reset"